@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+离线吞吐基准测试
+启动本地 HTTP 替身服务 (iTunes lookup JSON、合成 RSS Feed、音频文件),
+端到端运行 parse_rss_feed / download_audio / download_from_apple_url,
+输出 单集/秒、MB/s、峰值内存 (RSS) 和首字节时间,并把结果追加到结果文件,与上次结果对比
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import download_podcast as dp
+
+# 结果放在缓存目录下,运行基准测试不会改动技能目录
+DEFAULT_RESULTS = dp.DEFAULT_CACHE_DIR / 'benchmarks' / 'results.jsonl'
+SCENARIOS = ['rss_parse', 'audio_single', 'audio_segmented', 'end_to_end']
+PODCAST_ID = '1000000001'
+
+
+# ---------- 本地替身服务 ----------
+
+def audio_body(index, size):
+    """确定性的音频内容 (同一单集每次请求内容相同,便于 Range 续传)"""
+    seed = hashlib.sha256(str(index).encode()).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """客户端主动断开 (如并发获取的落选请求被取消) 属于正常情况,不打印异常"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class FakeServer:
+    """
+    iTunes / RSS / 音频 替身服务
+    latency: 每个请求返回响应头前的延迟 (秒);bandwidth: 每个连接的发送速率 (字节/秒,0 为不限)
+    ranges: 是否支持 Range;error_rate: 音频请求返回 503 的比例
+    """
+
+    def __init__(self, episodes=500, audio_size=8 * 1024 * 1024, latency=0.0, bandwidth=0,
+                 ranges=True, error_rate=0.0):
+        self.episodes = episodes
+        self.audio_size = audio_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.ranges = ranges
+        self.error_rate = error_rate
+        self._audio_cache = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(42)
+        self.httpd = QuietHTTPServer(('127.0.0.1', 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._feed = self._build_feed()
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+    def _release(self, index):
+        return datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(days=index)
+
+    def _episode(self, index):
+        return {
+            'wrapperType': 'podcastEpisode',
+            'trackId': 2000000000 + index,
+            'trackName': f'Episode {index}',
+            'collectionName': 'Benchmark Show',
+            'episodeGuid': f'bench-{index}',
+            'releaseDate': self._release(index).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'trackTimeMillis': 1800000,
+            'description': f'Synthetic episode {index}',
+            'episodeUrl': f'{self.base_url}/audio/{index}.mp3'
+        }
+
+    def _build_feed(self):
+        items = []
+        for index in range(self.episodes, 0, -1):
+            pub_date = self._release(index).strftime('%a, %d %b %Y %H:%M:%S +0000')
+            items.append(
+                f'<item><title>Episode {index}</title><guid>bench-{index}</guid>'
+                f'<pubDate>{pub_date}</pubDate><itunes:duration>1800</itunes:duration>'
+                f'<description>{escape("Synthetic episode <b>%d</b> " % index * 8)}</description>'
+                f'<enclosure url="{self.base_url}/audio/{index}.mp3" type="audio/mpeg" '
+                f'length="{self.audio_size}"/></item>'
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"><channel>'
+            '<title>Benchmark Show</title><itunes:author>Bench</itunes:author>'
+            + ''.join(items) + '</channel></rss>'
+        ).encode('utf-8')
+
+    def audio(self, index):
+        with self._lock:
+            if index not in self._audio_cache:
+                self._audio_cache[index] = audio_body(index, self.audio_size)
+            return self._audio_cache[index]
+
+    def fail(self):
+        with self._lock:
+            return self.error_rate and self._random.random() < self.error_rate
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_body(self, status, body, content_type, extra=None, head=False):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (extra or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if head:
+                    return
+                view = memoryview(body)
+                step = 64 * 1024
+                started = time.monotonic()
+                for offset in range(0, len(body), step):
+                    self.wfile.write(view[offset:offset + step])
+                    if server.bandwidth:
+                        # 按连接限速: 提前发送的部分补足睡眠
+                        ahead = (offset + step) / server.bandwidth - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == '/lookup':
+                    self.lookup(query)
+                elif url.path == '/feed.xml':
+                    self.send_body(200, server._feed, 'application/rss+xml',
+                                   {'ETag': '"feed-v1"'}, head)
+                elif url.path.startswith('/audio/'):
+                    self.audio(url.path, head)
+                else:
+                    self.send_body(404, b'', 'text/plain', head=head)
+
+            def lookup(self, query):
+                entity = query.get('entity', [''])[0]
+                show = {'wrapperType': 'track', 'collectionId': int(PODCAST_ID),
+                        'collectionName': 'Benchmark Show', 'artistName': 'Bench',
+                        'feedUrl': f'{server.base_url}/feed.xml'}
+                results = [show]
+                if entity == 'podcastEpisode':
+                    limit = int(query.get('limit', ['50'])[0])
+                    ids = query.get('id', [''])[0].split(',')
+                    if ids == [PODCAST_ID]:
+                        count = min(server.episodes, limit)
+                        results += [server._episode(i)
+                                    for i in range(server.episodes, server.episodes - count, -1)]
+                    else:
+                        results = [server._episode(int(i) - 2000000000) for i in ids if i.isdigit()]
+                body = json.dumps({'resultCount': len(results), 'results': results}).encode()
+                self.send_body(200, body, 'application/json')
+
+            def audio(self, path, head):
+                match = re.match(r'/audio/(\d+)\.mp3$', path)
+                if not match:
+                    self.send_body(404, b'', 'text/plain', head=head)
+                    return
+                if server.fail():
+                    self.send_body(503, b'', 'text/plain', head=head)
+                    return
+                data = server.audio(int(match.group(1)))
+                headers = {'ETag': '"audio-v1"'}
+                range_header = self.headers.get('Range') if server.ranges else None
+                if server.ranges:
+                    headers['Accept-Ranges'] = 'bytes'
+                if range_header and self.headers.get('If-Range') in (None, '"audio-v1"'):
+                    start, _, end = range_header.replace('bytes=', '').partition('-')
+                    start = int(start)
+                    end = int(end) if end else len(data) - 1
+                    headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+                    self.send_body(206, data[start:end + 1], 'audio/mpeg', headers, head)
+                else:
+                    self.send_body(200, data, 'audio/mpeg', headers, head)
+
+        return Handler
+
+
+# ---------- 场景 (在子进程中运行,峰值内存互不影响) ----------
+
+class EventCapture:
+    """收集 JSON Lines 进度事件,用于计算首字节时间"""
+
+    def __init__(self):
+        self.first_start = None
+
+    def write(self, line):
+        if self.first_start is None and '"event": "start"' in line:
+            self.first_start = time.perf_counter()
+
+    def flush(self):
+        pass
+
+
+def run_scenario(name, base_url, config, workdir):
+    """运行单个场景,返回指标 dict (elapsed 为墙钟秒数)"""
+    dp.ITUNES_LOOKUP_URL = f"{base_url}/lookup"
+    feed_url = f"{base_url}/feed.xml"
+    session = dp.create_session(pool_size=max(10, config['jobs'] * config['segments']))
+    capture = EventCapture()
+    metrics = {}
+    started = time.perf_counter()
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        if name == 'rss_parse':
+            # Feed 大小在计时前获取,计时只包含 parse_rss_feed 本身
+            metrics['bytes'] = int(session.head(feed_url).headers.get('Content-Length', 0))
+            started = time.perf_counter()
+            _, episodes = dp.parse_rss_feed(feed_url, session=session)
+            metrics['episodes'] = len(episodes)
+        elif name in ('audio_single', 'audio_segmented'):
+            segments = config['segments'] if name == 'audio_segmented' else 1
+            progress = dp.create_progress_reporter('jsonl', stream=capture)
+            ok = dp.download_audio(f"{base_url}/audio/1.mp3", Path(workdir) / 'episode.mp3',
+                                   'Episode 1', progress=progress, segments=segments,
+                                   session=session)
+            metrics['episodes'] = 1 if ok else 0
+            metrics['bytes'] = config['audio_size'] if ok else 0
+        elif name == 'end_to_end':
+            ok = dp.download_from_apple_url(
+                f"https://podcasts.apple.com/us/podcast/id{PODCAST_ID}", output_dir=workdir,
+                download_count=config['count'], jobs=config['jobs'], segments=config['segments'],
+                use_cache=False, progress_mode='jsonl', progress_stream=capture
+            )
+            files = list(Path(workdir).rglob('*.mp3'))
+            metrics['episodes'] = len(files) if ok else 0
+            metrics['bytes'] = sum(f.stat().st_size for f in files)
+        else:
+            raise ValueError(f"未知场景: {name}")
+
+    elapsed = time.perf_counter() - started
+    metrics['elapsed'] = round(elapsed, 4)
+    metrics['episodes_per_sec'] = round(metrics['episodes'] / elapsed, 2)
+    metrics['mb_per_sec'] = round(metrics['bytes'] / 1024 / 1024 / elapsed, 2)
+    metrics['ttfb_ms'] = (round((capture.first_start - started) * 1000, 1)
+                          if capture.first_start else None)
+    metrics['peak_rss_mb'] = peak_rss_mb()
+    return metrics
+
+
+def peak_rss_mb():
+    """
+    本进程的峰值内存
+    Linux 读取 /proc/self/status 的 VmHWM: ru_maxrss 会继承父进程 (运行替身服务) 的峰值
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss: Linux 为 KB,macOS 为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_in_subprocess(name, base_url, config):
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, __file__, '--child', name, '--base-url', base_url,
+             '--config', json.dumps(config), '--workdir', workdir],
+            capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"场景 {name} 运行失败:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# ---------- 结果保存与对比 ----------
+
+def code_version():
+    """当前代码版本 (git describe),不在 git 仓库中时返回 'unknown'"""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+
+def load_previous(results_path, scenario, config):
+    """同一场景、同一配置的上一次结果"""
+    previous = None
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('scenario') == scenario and record.get('config') == config:
+                    previous = record
+    except OSError:
+        pass
+    return previous
+
+
+def format_change(current, previous, higher_is_better=True):
+    if current is None or not previous:
+        return ''
+    change = (current - previous) / previous * 100
+    worse = change < 0 if higher_is_better else change > 0
+    marker = '⚠️ ' if worse and abs(change) >= 10 else ''
+    return f" ({marker}{change:+.0f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='播客下载器离线吞吐基准测试')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                       help='只运行指定场景 (可重复,默认: 全部)')
+    parser.add_argument('--episodes', type=int, default=1000, help='合成 RSS Feed 的单集数 (默认: 1000)')
+    parser.add_argument('--audio-size', default='8M', help='每个音频文件大小 (默认: 8M)')
+    parser.add_argument('--count', type=int, default=8, help='端到端场景下载的单集数 (默认: 8)')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='端到端场景的并发任务数 (默认: 4)')
+    parser.add_argument('--segments', type=int, default=4, help='分段下载场景的段数 (默认: 4)')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的响应延迟,毫秒 (默认: 0)')
+    parser.add_argument('--bandwidth', default='0', help='每个连接的发送速率,如 20M (默认: 不限)')
+    parser.add_argument('--no-ranges', action='store_true', help='音频服务不支持 Range')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                       help='音频请求返回 503 的比例,验证重试路径 (默认: 0)')
+    parser.add_argument('--results', default=str(DEFAULT_RESULTS),
+                       help=f'结果文件 (JSON Lines,默认: {DEFAULT_RESULTS})')
+    parser.add_argument('--label', help='附加在结果中的标签 (如分支名)')
+    parser.add_argument('--no-save', action='store_true', help='不保存结果')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        metrics = run_scenario(args.child, args.base_url, json.loads(args.config), args.workdir)
+        print(json.dumps(metrics))
+        return 0
+
+    config = {
+        'episodes': args.episodes,
+        'audio_size': dp.parse_rate(args.audio_size),
+        'count': args.count,
+        'jobs': args.jobs,
+        'segments': args.segments,
+        'latency_ms': args.latency,
+        'bandwidth': dp.parse_rate(args.bandwidth) or 0,
+        'ranges': not args.no_ranges,
+        'error_rate': args.error_rate
+    }
+    server = FakeServer(config['episodes'], config['audio_size'], config['latency_ms'] / 1000,
+                        config['bandwidth'], config['ranges'], config['error_rate']).start()
+    version = code_version()
+    results_path = Path(args.results)
+
+    print(f"🧪 基准测试 ({version}) | 服务: {server.base_url}")
+    print(f"   Feed {config['episodes']} 集 | 音频 {config['audio_size'] / 1024 / 1024:.0f} MB"
+          f" | 延迟 {config['latency_ms']:.0f} ms | 限速 {dp.format_rate(config['bandwidth'] or None)}"
+          f" | Range {'开' if config['ranges'] else '关'} | 错误率 {config['error_rate']:.0%}")
+    print(f"\n{'场景':<18}{'单集/秒':>10}{'MB/s':>16}{'首字节 ms':>18}{'峰值 RSS MB':>16}{'耗时 s':>10}")
+
+    try:
+        for scenario in args.scenario or SCENARIOS:
+            metrics = run_in_subprocess(scenario, server.base_url, config)
+            previous = load_previous(results_path, scenario, config)
+            prev = previous['metrics'] if previous else {}
+            print(f"{scenario:<18}"
+                  f"{metrics['episodes_per_sec']:>10.2f}"
+                  f"{metrics['mb_per_sec']:>10.1f}{format_change(metrics['mb_per_sec'], prev.get('mb_per_sec')):<6}"
+                  f"{metrics['ttfb_ms'] if metrics['ttfb_ms'] is not None else '-':>10}"
+                  f"{format_change(metrics['ttfb_ms'], prev.get('ttfb_ms'), False):<8}"
+                  f"{metrics['peak_rss_mb']:>10.1f}{format_change(metrics['peak_rss_mb'], prev.get('peak_rss_mb'), False):<6}"
+                  f"{metrics['elapsed']:>10.2f}")
+            if not args.no_save:
+                results_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(results_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({
+                        'timestamp': datetime.now().isoformat(timespec='seconds'),
+                        'version': version,
+                        'label': args.label,
+                        'python': sys.version.split()[0],
+                        'scenario': scenario,
+                        'config': config,
+                        'metrics': metrics
+                    }, ensure_ascii=False) + '\n')
+    finally:
+        server.stop()
+
+    if not args.no_save:
+        print(f"\n💾 结果已追加到: {results_path} (括号内为与上次相同配置结果的变化)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+音频写入路径基准测试
+在本地启动一个 HTTP 服务器提供随机数据,对比旧的 iter_content(8192) 写入循环
+与 download_audio 的大块复用缓冲区写入路径,输出每 GB 消耗的 CPU 时间
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from download_podcast import create_session, download_audio, parse_fsync_policy, parse_rate
+
+
+def make_handler(payload):
+    """返回固定内容的请求处理器,按 64 KB 分块发送"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            view = memoryview(payload)
+            for offset in range(0, len(payload), 65536):
+                self.wfile.write(view[offset:offset + 65536])
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def legacy_download(session, url, output_path):
+    """旧写入路径: 每 8 KB 一个新 bytes 对象和一次 f.write"""
+    response = session.get(url, stream=True, timeout=30)
+    response.raise_for_status()
+    with open(output_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                f.write(chunk)
+    return True
+
+
+def current_download(session, url, output_path, fsync_policy=None):
+    """新写入路径,屏蔽进度输出"""
+    with open(os.devnull, 'w') as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            return download_audio(url, output_path, 'benchmark', session=session,
+                                  fsync_policy=fsync_policy)
+        finally:
+            sys.stdout = stdout
+
+
+def measure(name, func, size, rounds):
+    """运行 rounds 次,返回 (CPU 秒/GB, 墙钟 MB/s) 的最好成绩"""
+    best_cpu = best_wall = None
+    for _ in range(rounds):
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        if not func():
+            raise RuntimeError(f"{name} 下载失败")
+        cpu = time.thread_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+    gigabytes = size / (1024 ** 3)
+    return best_cpu / gigabytes, size / (1024 * 1024) / best_wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description='音频写入路径 CPU/GB 基准测试')
+    parser.add_argument('--size', default='256M', help='测试文件大小 (默认: 256M)')
+    parser.add_argument('--rounds', type=int, default=3, help='每种写入路径运行次数,取最好成绩 (默认: 3)')
+    parser.add_argument('--fsync', type=parse_fsync_policy, default=None,
+                       help='新写入路径使用的 fsync 策略 (默认: none)')
+    args = parser.parse_args()
+
+    size = parse_rate(args.size)
+    payload = os.urandom(size)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(payload))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/episode.mp3"
+    session = create_session()
+
+    print(f"📦 测试文件: {size / (1024 * 1024):.0f} MB,每种路径运行 {args.rounds} 次")
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, 'episode.mp3')
+
+        def run_legacy():
+            return legacy_download(session, url, output_path)
+
+        def run_current():
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return current_download(session, url, output_path, args.fsync)
+
+        results = [
+            ('iter_content(8192)', measure('legacy', run_legacy, size, args.rounds)),
+            ('复用缓冲区 + 自适应块', measure('current', run_current, size, args.rounds)),
+        ]
+        if os.path.getsize(output_path) != size:
+            raise RuntimeError("输出文件大小不正确")
+    server.shutdown()
+
+    print(f"\n{'写入路径':<24}{'CPU 秒/GB':>12}{'吞吐 MB/s':>12}")
+    for name, (cpu_per_gb, throughput) in results:
+        print(f"{name:<24}{cpu_per_gb:>12.2f}{throughput:>12.1f}")
+    before, after = results[0][1][0], results[1][1][0]
+    print(f"\n⚡ CPU/GB 降低 {(1 - after / before) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
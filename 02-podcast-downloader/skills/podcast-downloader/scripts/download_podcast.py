@@ -8,11 +8,28 @@ import sys
 import argparse
 import requests
 import feedparser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
+import hashlib
+import heapq
 import json
+import os
+import random
 import re
-from datetime import datetime
+import shutil
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 
 def sanitize_filename(filename):
@@ -22,6 +39,758 @@ def sanitize_filename(filename):
     return filename[:200] if len(filename) > 200 else filename
 
 
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+
+# iTunes lookup 接口地址,可用环境变量指向本地替身服务 (如基准测试)
+ITUNES_LOOKUP_URL = os.environ.get('PODCAST_DOWNLOADER_ITUNES_URL', 'https://itunes.apple.com/lookup')
+
+# 本地缓存目录 (RSS Feed 缓存等),可用环境变量覆盖
+DEFAULT_CACHE_DIR = Path(os.environ.get('PODCAST_DOWNLOADER_CACHE',
+                                        Path.home() / '.cache' / 'podcast-downloader'))
+
+# 分段下载时每段的最小字节数,小文件不值得拆分
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# watch 模式的检查间隔范围 (秒) 与失败退避上限
+WATCH_MIN_INTERVAL = 15 * 60
+WATCH_MAX_INTERVAL = 24 * 3600
+WATCH_MAX_BACKOFF = 12 * 3600
+
+# 写入路径的读取块大小范围: 根据每次读取耗时在两者之间自适应调整
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def create_session(pool_size=10, retries=3, backoff=0.5):
+    """
+    创建共享的 HTTP 会话 (连接池 + keep-alive + 自动重试)
+    iTunes 查询、RSS 获取和音频下载复用同一个会话,避免重复的 DNS/TCP/TLS 握手
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_session(session=None):
+    """返回传入的会话,未传入时使用进程内共享的默认会话"""
+    global _default_session
+    if session is not None:
+        return session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = create_session()
+        return _default_session
+
+
+class HostLimiter:
+    """
+    按主机限制并发连接数
+    同一个 CDN 主机最多同时占用 per_host 个连接,避免被源站限流
+    """
+
+    def __init__(self, per_host=4):
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            sem = self._semaphores.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = sem
+        with sem:
+            yield
+
+
+def parse_rate(value):
+    """
+    解析带宽字符串: '500K' / '2M' / '1.5M' / '1048576' -> 字节/秒
+    'off'、'0' 或空值表示不限速,返回 None
+    """
+    if value is None:
+        return None
+    value = str(value).strip().upper()
+    if value in ('', '0', 'OFF', 'NONE'):
+        return None
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    multiplier = 1
+    if value[-1] in units:
+        multiplier = units[value[-1]]
+        value = value[:-1]
+    elif value.endswith('B'):
+        value = value[:-1]
+    rate = float(value) * multiplier
+    return int(rate) if rate > 0 else None
+
+
+class TokenBucket:
+    """
+    令牌桶: 按 rate 字节/秒补充令牌,最多积累 burst 字节 (允许短时突发)
+    令牌不足时记为欠账并休眠,多个线程共享同一个桶时按到达顺序排队
+    """
+
+    def __init__(self, rate, burst=None):
+        self._lock = threading.Lock()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        with self._lock:
+            self.rate = rate
+            self.burst = burst or max(rate or 0, 64 * 1024)
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    def consume(self, n):
+        with self._lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class BandwidthLimiter:
+    """
+    进程级带宽限制: 所有并发传输共享一个全局令牌桶,可选再按主机限速
+    限速可在运行时调整: 修改控制文件 (内容如 "2M" 或 "2M 512K",即 全局 [每主机])
+    会在 1 秒内生效,也可发送 SIGHUP 立即重新加载
+    """
+
+    def __init__(self, rate=None, per_host_rate=None, control_file=None):
+        self.per_host_rate = per_host_rate
+        self.control_file = Path(control_file) if control_file else None
+        self._global = TokenBucket(rate)
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._started = time.monotonic()
+        self._control_mtime = None
+        self._stop = threading.Event()
+        if self.control_file:
+            self.reload(announce=False)
+            threading.Thread(target=self._watch, daemon=True).start()
+            if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGHUP, lambda signum, frame: self.reload(force=True))
+
+    @property
+    def rate(self):
+        return self._global.rate
+
+    def set_rates(self, rate, per_host_rate=None):
+        self._global.set_rate(rate)
+        with self._lock:
+            self.per_host_rate = per_host_rate
+            for bucket in self._hosts.values():
+                bucket.set_rate(per_host_rate)
+
+    def reload(self, force=False, announce=True):
+        """从控制文件读取限速设置 (文件未变化时跳过)"""
+        try:
+            mtime = self.control_file.stat().st_mtime
+            if not force and mtime == self._control_mtime:
+                return
+            self._control_mtime = mtime
+            parts = self.control_file.read_text(encoding='utf-8').split()
+            rate = parse_rate(parts[0]) if parts else None
+            per_host_rate = parse_rate(parts[1]) if len(parts) > 1 else self.per_host_rate
+        except (OSError, ValueError):
+            return
+        self.set_rates(rate, per_host_rate)
+        if announce:
+            print(f"\n🚦 限速已更新: {format_rate(rate)} (每主机 {format_rate(per_host_rate)})", flush=True)
+
+    def _watch(self):
+        while not self._stop.wait(1.0):
+            self.reload()
+
+    def throttle(self, url, n):
+        """记录传输了 n 字节,超出限额时阻塞当前线程"""
+        with self._lock:
+            self._bytes += n
+            bucket = None
+            if self.per_host_rate:
+                host = urlparse(url).netloc.lower()
+                bucket = self._hosts.get(host)
+                if bucket is None:
+                    bucket = TokenBucket(self.per_host_rate)
+                    self._hosts[host] = bucket
+        if bucket is not None:
+            bucket.consume(n)
+        self._global.consume(n)
+
+    def throughput(self):
+        """返回实际平均吞吐 (字节/秒)"""
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        return self._bytes / elapsed
+
+    def close(self):
+        self._stop.set()
+
+
+def format_rate(rate):
+    if not rate:
+        return '不限'
+    return f"{rate / 1024 / 1024:.2f} MB/s"
+
+
+class ProgressTracker:
+    """
+    单个下载的进度跟踪: 计算速率和剩余时间,按时间间隔或百分比步长节流后发出事件
+    分段下载时多个线程共用同一个 tracker
+    """
+
+    def __init__(self, reporter, title, filename):
+        self.reporter = reporter
+        self.title = title
+        self.filename = filename
+        self.total = 0
+        self.downloaded = 0
+        self.resumed_from = 0
+        self._started = time.monotonic()
+        self._last_emit = 0.0
+        self._last_percent = 0.0
+        self._lock = threading.Lock()
+
+    def _event(self, name, **fields):
+        event = {'event': name, 'title': self.title, 'file': self.filename}
+        event.update(fields)
+        self.reporter.emit(event)
+
+    def _rate(self):
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        return (self.downloaded - self.resumed_from) / elapsed
+
+    def start(self, total, resumed_from=0, segments=1):
+        with self._lock:
+            self.total = total
+            self.downloaded = resumed_from
+            self.resumed_from = resumed_from
+            self._started = time.monotonic()
+        self._event('start', total=total, resumed_from=resumed_from, segments=segments)
+
+    def advance(self, n):
+        with self._lock:
+            self.downloaded += n
+            if self.total and self.downloaded >= self.total:
+                # 已到达 100%,随后的 done 事件会输出最终进度,不再重复发出 bytes 事件
+                return
+            now = time.monotonic()
+            percent = self.downloaded / self.total * 100 if self.total else 0.0
+            if (now - self._last_emit < self.reporter.interval
+                    and percent - self._last_percent < self.reporter.percent_step):
+                return
+            self._last_emit = now
+            self._last_percent = percent
+            downloaded, total, rate = self.downloaded, self.total, self._rate()
+        eta = (total - downloaded) / rate if total and rate > 0 else None
+        self._event('bytes', bytes=downloaded, total=total, percent=round(percent, 1),
+                    rate=int(rate), eta=round(eta, 1) if eta is not None else None)
+
+    def done(self):
+        elapsed = time.monotonic() - self._started
+        self._event('done', bytes=self.downloaded, total=self.total, rate=int(self._rate()),
+                    elapsed=round(elapsed, 2))
+
+    def skip(self, reason):
+        self._event('skip', reason=reason)
+
+    def error(self, message):
+        self._event('error', bytes=self.downloaded, total=self.total, message=message)
+
+
+class ProgressReporter:
+    """
+    进度事件源: ProgressTracker 产生的事件经节流后交给渲染器
+    渲染器决定输出形式 (终端单行进度、并发汇总行、JSON Lines)
+    interval: 两次 bytes 事件的最小间隔 (秒);percent_step: 进度每增加该百分比也会发出事件
+    """
+
+    def __init__(self, renderer, interval=0.5, percent_step=10.0):
+        self.renderer = renderer
+        self.interval = interval
+        self.percent_step = percent_step
+        self._lock = threading.Lock()
+
+    def track(self, title, filename):
+        return ProgressTracker(self, title, filename)
+
+    def emit(self, event):
+        event['ts'] = round(time.time(), 3)
+        with self._lock:
+            self.renderer.handle(event)
+
+    def log(self, message):
+        with self._lock:
+            self.renderer.log(message)
+
+    def close(self):
+        with self._lock:
+            self.renderer.close()
+
+
+class ConsoleRenderer:
+    """顺序下载时的终端输出: 单个文件一行 \r 进度"""
+
+    def handle(self, event):
+        name = event['event']
+        if name == 'start':
+            if event['segments'] > 1:
+                print(f"   ⬇️  正在分段下载: {event['title']} ({event['segments']} 段)")
+            elif event['resumed_from']:
+                print(f"   ⬇️  正在续传: {event['title']} (已有 {event['resumed_from'] / 1024 / 1024:.1f} MB)")
+            else:
+                print(f"   ⬇️  正在下载: {event['title']}")
+        elif name == 'bytes' and event['total']:
+            print(f"\r   进度: {event['percent']:.1f}% ({event['bytes'] / 1024 / 1024:.1f}/"
+                  f"{event['total'] / 1024 / 1024:.1f} MB)", end='', flush=True)
+        elif name == 'done':
+            if event['total']:
+                print(f"\r   进度: 100.0% ({event['total'] / 1024 / 1024:.1f}/"
+                      f"{event['total'] / 1024 / 1024:.1f} MB)", end='')
+            print()
+        elif name == 'skip':
+            print(f"   ⏭️  {event['reason']}: {event['file']}")
+        elif name == 'error':
+            print(f"\n   ❌ 下载失败: {event['message']}")
+
+    def log(self, message):
+        print(message)
+
+    def close(self):
+        pass
+
+
+class AggregateConsoleRenderer:
+    """
+    并发下载时的终端输出: 汇总所有下载,只在一行中刷新
+    替代每个下载各自输出的 \r 进度行
+    """
+
+    def __init__(self, total_episodes, interval=0.5):
+        self.total_episodes = total_episodes
+        self.interval = interval
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.started = time.monotonic()
+        self._bytes = {}
+        self._last_render = 0.0
+
+    def handle(self, event):
+        name = event['event']
+        key = event['file']
+        if name == 'start':
+            self.active += 1
+            self._bytes[key] = event['resumed_from']
+        elif name == 'bytes':
+            self._bytes[key] = event['bytes']
+        elif name in ('done', 'skip', 'error'):
+            if key in self._bytes:
+                self.active -= 1
+            if name == 'done':
+                self._bytes[key] = event['bytes']
+            if name == 'error':
+                self.failed += 1
+                self.log(f"   ❌ 下载失败: {event['title']}: {event['message']}")
+            else:
+                self.completed += 1
+                if name == 'skip':
+                    self.log(f"   ⏭️  {event['reason']}: {key}")
+        self.render(force=name != 'bytes')
+
+    def log(self, message):
+        """输出一行日志,不破坏进度行"""
+        print(f"\r\033[K{message}", flush=True)
+        self.render(force=True)
+
+    def render(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_render < self.interval:
+            return
+        self._last_render = now
+        elapsed = max(now - self.started, 1e-6)
+        mb_done = sum(self._bytes.values()) / 1024 / 1024
+        speed = mb_done / elapsed
+        finished = self.completed + self.failed
+        print(f"\r\033[K   总进度: {finished}/{self.total_episodes} 集"
+              f" | 进行中 {self.active} | {mb_done:.1f} MB | {speed:.1f} MB/s",
+              end='', flush=True)
+
+    def close(self):
+        self.render(force=True)
+        print()
+
+
+class LogRenderer:
+    """长时间运行 (watch 模式) 的终端输出: 每个下载只输出开始/结束日志,不刷新进度行"""
+
+    def handle(self, event):
+        name = event['event']
+        if name == 'start':
+            print(f"   ⬇️  开始下载: {event['title']}")
+        elif name == 'done':
+            print(f"   ✅ 下载完成: {event['file']} ({event['bytes'] / 1024 / 1024:.1f} MB)")
+        elif name == 'skip':
+            print(f"   ⏭️  {event['reason']}: {event['file']}")
+        elif name == 'error':
+            print(f"   ❌ 下载失败: {event['title']}: {event['message']}")
+
+    def log(self, message):
+        print(message, flush=True)
+
+    def close(self):
+        pass
+
+
+class JsonLinesRenderer:
+    """
+    机器可读的进度输出: 每个事件一行 JSON (start / bytes / done / skip / error / log)
+    供编排程序解析,人类可读的日志此时输出到 stderr
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def handle(self, event):
+        self.stream.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def log(self, message):
+        self.handle({'event': 'log', 'message': message.strip(), 'ts': round(time.time(), 3)})
+
+    def close(self):
+        self.stream.flush()
+
+
+def create_progress_reporter(mode='human', total_episodes=1, concurrent=False, stream=None):
+    """按输出模式创建进度事件源: mode 为 'human' 或 'jsonl'"""
+    if mode == 'jsonl':
+        return ProgressReporter(JsonLinesRenderer(stream), interval=1.0, percent_step=5.0)
+    if concurrent:
+        return ProgressReporter(AggregateConsoleRenderer(total_episodes), interval=0.5)
+    return ProgressReporter(ConsoleRenderer(), interval=0.2)
+
+
+def _atomic_write_json(path, data):
+    """先写临时文件再重命名,避免并发读取到半个 JSON"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    tmp_path.replace(path)
+
+
+class FeedCache:
+    """
+    RSS Feed 磁盘缓存 (条件请求)
+    保存 Feed 原文、ETag / Last-Modified 以及解析后的节目列表;
+    再次获取时发送 If-None-Match / If-Modified-Since,304 时直接复用解析结果。
+    总大小超过 max_bytes 时按最近使用时间淘汰,命中统计写入 stats.json 便于监控
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR) / 'feeds'
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats_path = self.cache_dir / 'stats.json'
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / f'{key}.json', self.cache_dir / f'{key}.xml'
+
+    def load(self, url):
+        """返回缓存条目 (不含原文),不存在时返回 None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url or not body_path.exists():
+            return None
+        return entry
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, url):
+        """记录最近使用时间 (用于 LRU 淘汰)"""
+        meta_path, _ = self._paths(url)
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+    def store(self, url, body, etag, last_modified, podcast_info, episodes, complete=True):
+        """complete=False 表示流式解析提前停止,body 和 episodes 只包含 Feed 的开头部分"""
+        meta_path, body_path = self._paths(url)
+        with self._lock:
+            body_path.write_bytes(body)
+            _atomic_write_json(meta_path, {
+                'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'stored_at': datetime.now().isoformat(),
+                'podcast_info': podcast_info,
+                'episodes': episodes,
+                'complete': complete
+            })
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for meta_path in self.cache_dir.glob('*.json'):
+            if meta_path == self.stats_path:
+                continue
+            body_path = meta_path.with_suffix('.xml')
+            try:
+                size = meta_path.stat().st_size + (body_path.stat().st_size if body_path.exists() else 0)
+                entries.append((meta_path.stat().st_mtime, size, meta_path, body_path))
+            except OSError:
+                continue
+            total += size
+        
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            meta_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            total -= size
+
+    def record(self, outcome):
+        """累计命中统计: outcome 为 'hit' (304) 或 'miss' (重新下载)"""
+        with self._lock:
+            stats = self.stats()
+            stats[outcome] = stats.get(outcome, 0) + 1
+            stats['updated_at'] = datetime.now().isoformat()
+            _atomic_write_json(self.stats_path, stats)
+
+    def stats(self):
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'hit': 0, 'miss': 0}
+
+
+# iTunes lookup 接口单次最多返回的单集数
+API_EPISODE_LIMIT = 200
+
+# 下载前检查磁盘空间时默认保留的空闲空间
+DEFAULT_MIN_FREE = 512 * 1024 * 1024
+
+# 批量模式下一次 lookup 请求最多查询的单集 ID 数
+BATCH_LOOKUP_SIZE = 50
+
+# iTunes 查询缓存有效期 (秒): entity -> (新鲜期, 可返回旧数据的最长期限)
+# 播客 -> feedUrl 的映射几乎不变,单集列表则需要较快刷新
+LOOKUP_TTLS = {
+    'podcast': (30 * 86400, 365 * 86400),
+    'podcastEpisode': (3600, 7 * 86400),
+}
+
+
+class LookupCache:
+    """
+    iTunes lookup 接口的本地 SQLite 缓存
+    以 (id, entity, country, limit) 为键,按 entity 设置有效期;
+    数据过期但仍在可用期内时先返回旧数据,同时在后台重新获取 (stale-while-revalidate)
+    refresh=True 时跳过缓存读取,强制请求 API
+    """
+
+    def __init__(self, cache_dir=None, refresh=False):
+        cache_root = Path(cache_dir or DEFAULT_CACHE_DIR)
+        cache_root.mkdir(parents=True, exist_ok=True)
+        self.db_path = cache_root / 'itunes_lookup.sqlite3'
+        self.refresh = refresh
+        self._revalidating = {}
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lookups (
+                    id TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    country TEXT NOT NULL,
+                    lim INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (id, entity, country, lim)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, key):
+        """返回 (data, is_fresh),没有可用缓存时返回 (None, False)"""
+        if self.refresh:
+            return None, False
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fetched_at, payload FROM lookups WHERE id=? AND entity=? AND country=? AND lim=?",
+                key
+            ).fetchone()
+        if not row:
+            return None, False
+        fresh_ttl, stale_ttl = LOOKUP_TTLS.get(key[1], (3600, 86400))
+        age = time.time() - row[0]
+        if age > stale_ttl:
+            return None, False
+        return json.loads(row[1]), age <= fresh_ttl
+
+    def put(self, key, data):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lookups (id, entity, country, lim, fetched_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, time.time(), json.dumps(data, ensure_ascii=False))
+            )
+
+    def revalidate(self, key, fetch):
+        """
+        在后台线程中重新获取并更新缓存 (同一个键只启动一次)
+        新数据没有结果时保留旧缓存,与前台请求的写入条件一致
+        """
+        with self._lock:
+            if key in self._revalidating:
+                return
+
+            def run():
+                try:
+                    data = fetch()
+                    if data.get('resultCount', 0) > 0 and data.get('results'):
+                        self.put(key, data)
+                except Exception:
+                    pass
+                finally:
+                    with self._lock:
+                        self._revalidating.pop(key, None)
+
+            thread = threading.Thread(target=run, daemon=True)
+            self._revalidating[key] = thread
+        thread.start()
+
+    def wait(self, timeout=15):
+        """等待后台刷新完成 (进程退出前调用)"""
+        with self._lock:
+            threads = list(self._revalidating.values())
+        for thread in threads:
+            thread.join(timeout)
+
+
+class CancelToken:
+    """
+    并发获取的取消信号 (接口同 threading.Event 的 set / is_set)
+    set() 时中断登记过的响应: 落选策略正在读取的连接立即关闭,不必等到超时
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._responses = set()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            responses, self._responses = self._responses, set()
+        for resp in responses:
+            _abort_response(resp)
+
+    def register(self, resp):
+        """登记正在读取的响应;已取消时直接中断"""
+        with self._lock:
+            cancelled = self._event.is_set()
+            if not cancelled:
+                self._responses.add(resp)
+        if cancelled:
+            _abort_response(resp)
+
+    def unregister(self, resp):
+        with self._lock:
+            self._responses.discard(resp)
+
+    @contextmanager
+    def track(self, resp):
+        """在 with 块内登记响应"""
+        self.register(resp)
+        try:
+            yield resp
+        finally:
+            self.unregister(resp)
+
+
+def _abort_response(resp):
+    """关闭响应及其连接;先 shutdown 套接字,使另一线程中阻塞的读取立即返回"""
+    sock = getattr(getattr(resp.raw, 'connection', None), 'sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    resp.close()
+
+
+def _itunes_lookup(url, key, timeout, session=None, cache=None, cancel=None):
+    """
+    请求 iTunes lookup 接口并返回 JSON
+    key: (id, entity, country, limit),传入 cache 时用于读写 LookupCache
+    cancel: CancelToken,被设置时中断正在读取的响应 (后台刷新缓存不受影响)
+    """
+    def fetch(cancel=None):
+        if cancel is None:
+            resp = get_session(session).get(url, timeout=timeout)
+            resp.raise_for_status()
+            return resp.json()
+        with get_session(session).get(url, timeout=timeout, stream=True) as resp, cancel.track(resp):
+            resp.raise_for_status()
+            return resp.json()
+    
+    if cache is None:
+        return fetch(cancel)
+    
+    key = tuple(str(part) for part in key[:3]) + (int(key[3] or 0),)
+    data, is_fresh = cache.get(key)
+    if data is not None:
+        if not is_fresh:
+            cache.revalidate(key, fetch)
+        return data
+    
+    data = fetch(cancel)
+    if data.get('resultCount', 0) > 0 and data.get('results'):
+        cache.put(key, data)
+    return data
+
+
 def extract_podcast_info(apple_url):
     """
     从 Apple Podcast URL 中提取信息
@@ -42,20 +811,26 @@ def extract_podcast_info(apple_url):
     return podcast_id, episode_id, country_code
 
 
-def fetch_episodes_via_api(collection_id, country_code, limit=200):
+def _strategy_print(cancel, message):
+    """并发获取中的输出: 策略已落选 (cancel 被设置) 时不再打印"""
+    if cancel is None or not cancel.is_set():
+        print(message)
+
+
+def fetch_episodes_via_api(collection_id, country_code, limit=API_EPISODE_LIMIT, session=None,
+                           cache=None, cancel=None):
     """
     通过 iTunes API 获取播客节目列表
+    cancel: CancelToken,由并发获取传入: 不输出进度提示,被设置后中断请求且不再输出错误信息
     返回: (podcast_info, episodes_list)
     """
-    api_url = f"https://itunes.apple.com/lookup?id={collection_id}&entity=podcastEpisode&country={country_code}&limit={limit}"
+    api_url = f"{ITUNES_LOOKUP_URL}?id={collection_id}&entity=podcastEpisode&country={country_code}&limit={limit}"
     
     try:
-        print(f"📡 正在通过 API 获取节目信息...")
-        resp = requests.get(api_url, timeout=15, headers={
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
-        resp.raise_for_status()
-        data = resp.json()
+        if cancel is None:
+            print(f"📡 正在通过 API 获取节目信息...")
+        data = _itunes_lookup(api_url, (collection_id, 'podcastEpisode', country_code, limit),
+                              timeout=15, session=session, cache=cache, cancel=cancel)
         
         results = data.get('results', [])
         if not results:
@@ -70,22 +845,20 @@ def fetch_episodes_via_api(collection_id, country_code, limit=200):
         return podcast_info, episodes
     
     except Exception as e:
-        print(f"⚠️  API 获取失败: {e}")
+        _strategy_print(cancel, f"⚠️  API 获取失败: {e}")
         return None, []
 
 
-def fetch_episode_by_id(episode_id, country_code):
+def fetch_episode_by_id(episode_id, country_code, session=None, cache=None, cancel=None):
     """
     直接通过单集 ID 获取信息
+    cancel: CancelToken,被设置后中断请求
     """
-    track_url = f"https://itunes.apple.com/lookup?id={episode_id}&entity=podcastEpisode&country={country_code}"
+    track_url = f"{ITUNES_LOOKUP_URL}?id={episode_id}&entity=podcastEpisode&country={country_code}"
     
     try:
-        resp = requests.get(track_url, timeout=10, headers={
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
-        resp.raise_for_status()
-        data = resp.json()
+        data = _itunes_lookup(track_url, (episode_id, 'podcastEpisode', country_code, 0),
+                              timeout=10, session=session, cache=cache, cancel=cancel)
         
         if data.get('resultCount', 0) > 0:
             return data['results'][0]
@@ -95,16 +868,54 @@ def fetch_episode_by_id(episode_id, country_code):
     return None
 
 
-def get_rss_feed_url(podcast_id, country_code):
+def fetch_episodes_by_ids(episode_ids, country_code, session=None, cache=None):
+    """
+    批量获取单集信息: 使用 lookup 接口的多 ID 形式 (id=1,2,3),每次最多 BATCH_LOOKUP_SIZE 个
+    结果按单集拆分写入缓存 (与 fetch_episode_by_id 共用缓存键),已缓存的 ID 不再请求
+    返回: {单集 ID: episode},查不到的 ID 不在结果中
+    """
+    found = {}
+    missing = []
+    for episode_id in dict.fromkeys(str(i) for i in episode_ids):
+        if cache is not None:
+            data, is_fresh = cache.get((episode_id, 'podcastEpisode', country_code, 0))
+            if data is not None and is_fresh and data.get('results'):
+                found[episode_id] = data['results'][0]
+                continue
+        missing.append(episode_id)
+    
+    for start in range(0, len(missing), BATCH_LOOKUP_SIZE):
+        chunk = missing[start:start + BATCH_LOOKUP_SIZE]
+        lookup_url = (f"{ITUNES_LOOKUP_URL}?id={','.join(chunk)}"
+                      f"&entity=podcastEpisode&country={country_code}")
+        try:
+            resp = get_session(session).get(lookup_url, timeout=15)
+            resp.raise_for_status()
+            results = resp.json().get('results', [])
+        except Exception as e:
+            print(f"⚠️  批量查询失败 ({len(chunk)} 个单集): {e}")
+            continue
+        for result in results:
+            episode_id = str(result.get('trackId', ''))
+            if result.get('wrapperType') != 'podcastEpisode' or episode_id not in chunk:
+                continue
+            found[episode_id] = result
+            if cache is not None:
+                cache.put((episode_id, 'podcastEpisode', country_code, 0),
+                          {'resultCount': 1, 'results': [result]})
+    return found
+
+
+def get_rss_feed_url(podcast_id, country_code, session=None, cache=None, cancel=None):
     """
     获取播客的 RSS Feed URL
+    cancel: CancelToken,被设置后中断请求
     """
-    lookup_url = f"https://itunes.apple.com/lookup?id={podcast_id}&country={country_code}&entity=podcast"
+    lookup_url = f"{ITUNES_LOOKUP_URL}?id={podcast_id}&country={country_code}&entity=podcast"
     
     try:
-        resp = requests.get(lookup_url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = _itunes_lookup(lookup_url, (podcast_id, 'podcast', country_code, 0),
+                              timeout=10, session=session, cache=cache, cancel=cancel)
         
         if data.get('resultCount', 0) > 0:
             return data['results'][0].get('feedUrl')
@@ -114,133 +925,1592 @@ def get_rss_feed_url(podcast_id, country_code):
     return None
 
 
-def parse_rss_feed(rss_url):
+ITUNES_NS = '{http://www.itunes.com/dtds/podcast-1.0.dtd}'
+
+
+class _TeeReader:
+    """包装响应流,记录已读取的原始字节 (用于写入 Feed 缓存)"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.chunks = []
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        if data:
+            self.chunks.append(data)
+        return data
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def iter_rss_episodes(stream, feed_info):
+    """
+    增量解析 RSS (iterparse),逐个产出带音频附件的单集
+    每个 <item> 处理完立即从树中移除,内存占用与 Feed 大小无关;
+    调用方停止迭代后不再读取剩余内容。
+    频道标题和作者写入 feed_info (出现在第一个 <item> 之前时)
+    """
+    stack = []
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        
+        stack.pop()
+        parent = stack[-1] if stack else None
+        
+        if parent is not None and parent.tag == 'channel':
+            if elem.tag == 'title' and 'title' not in feed_info:
+                feed_info['title'] = (elem.text or '').strip()
+            elif elem.tag in (ITUNES_NS + 'author', 'author') and 'author' not in feed_info:
+                feed_info['author'] = (elem.text or '').strip()
+        
+        if elem.tag != 'item':
+            continue
+        
+        audio_url = None
+        for enclosure in elem.iter('enclosure'):
+            if 'audio' in enclosure.get('type', ''):
+                audio_url = enclosure.get('url')
+                break
+        
+        episode = None
+        if audio_url:
+            episode = {
+                'trackName': (elem.findtext('title') or '').strip(),
+                'releaseDate': (elem.findtext('pubDate') or '').strip(),
+                'episodeUrl': audio_url,
+                'description': elem.findtext('description') or elem.findtext(ITUNES_NS + 'summary') or '',
+                'trackTimeMillis': 0,  # RSS 中可能没有
+                'episodeGuid': (elem.findtext('guid') or '').strip()
+            }
+        
+        elem.clear()
+        if parent is not None:
+            parent.remove(elem)
+        
+        if episode:
+            yield episode
+
+
+def _parse_feed_document(content, response_headers):
+    """用 feedparser 解析完整的 Feed 文档,返回 (feed_info, episodes)"""
+    feed = feedparser.parse(content, response_headers=response_headers)
+    
+    if feed.bozo:
+        print(f"⚠️  RSS 解析警告: {feed.bozo_exception}")
+    
+    feed_info = {
+        'title': feed.feed.get('title', 'Unknown Podcast'),
+        'author': feed.feed.get('author', '')
+    }
+    
+    episodes = []
+    for entry in feed.entries:
+        audio_url = None
+        for enclosure in entry.get('enclosures', []):
+            if 'audio' in enclosure.get('type', ''):
+                audio_url = enclosure.get('href')
+                break
+        
+        if audio_url:
+            episodes.append({
+                'trackName': entry.get('title', ''),
+                'releaseDate': entry.get('published', ''),
+                'episodeUrl': audio_url,
+                'description': entry.get('summary', ''),
+                'trackTimeMillis': 0,  # RSS 中可能没有
+                'episodeGuid': entry.get('id', '')
+            })
+    
+    return feed_info, episodes
+
+
+def parse_rss_feed(rss_url, session=None, cache=None, limit=None, cancel=None):
     """
     解析 RSS Feed (作为 API 失败时的备选方案)
+    Feed 内容通过共享会话获取,feedparser 只负责解析
+    cache: FeedCache,传入时使用条件请求,Feed 未变化 (304) 时跳过解析
+    limit: 只需要最新 N 集时,取到 N 个音频附件后立即停止读取
+    cancel: CancelToken,由并发获取传入: 不输出进度提示,被设置后中断读取并返回空结果,且不再输出
     """
+    resp = None
     try:
-        print(f"📡 正在解析 RSS Feed...")
-        feed = feedparser.parse(rss_url, request_headers={
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
+        if cancel is None:
+            print(f"📡 正在解析 RSS Feed...")
+        session = get_session(session)
+        cached = cache.load(rss_url) if cache else None
+        if cached and not cached.get('complete', True) and (not limit or len(cached['episodes']) < limit):
+            # 缓存中只有部分单集,不够用时重新完整获取
+            cached = None
+        headers = cache.conditional_headers(cached) if cache else {}
+        resp = session.get(rss_url, timeout=30, headers=headers, stream=True)
+        if cancel is not None:
+            cancel.register(resp)
+        
+        if resp.status_code == 304 and cached:
+            resp.close()
+            cache.record('hit')
+            cache.touch(rss_url)
+            _strategy_print(cancel, f"♻️  RSS Feed 未变化,使用缓存 ({len(cached['episodes'])} 集)")
+            return cached['podcast_info'], cached['episodes']
+        
+        resp.raise_for_status()
+        # 不传 content-location: 否则 feedparser 会把非 URL 的 guid 解析成相对链接,
+        # 与流式解析和 iTunes API 的 episodeGuid 不一致
+        response_headers = {}
+        if resp.headers.get('Content-Type'):
+            response_headers['content-type'] = resp.headers['Content-Type']
+        
+        # 优先流式解析;非标准 XML (或 Atom 等格式) 交给 feedparser 完整解析
+        resp.raw.decode_content = True
+        reader = _TeeReader(resp.raw)
+        feed_info = {}
+        episodes = []
+        complete = True
+        try:
+            for episode in iter_rss_episodes(reader, feed_info):
+                if cancel is not None and cancel.is_set():
+                    resp.close()
+                    return None, []
+                episodes.append(episode)
+                if limit and len(episodes) >= limit:
+                    complete = False
+                    break
+        except ET.ParseError as e:
+            _strategy_print(cancel, f"⚠️  流式解析失败,改用完整解析: {e}")
+            episodes = []
         
-        if feed.bozo:
-            print(f"⚠️  RSS 解析警告: {feed.bozo_exception}")
+        if episodes:
+            content = reader.getvalue()
+        else:
+            content = reader.getvalue() + resp.raw.read()
+            complete = True
+            episodes = None
+        resp.close()
         
-        if not feed.entries:
+        if episodes is None:
+            if cancel is not None and cancel.is_set():
+                return None, []
+            feed_info, episodes = _parse_feed_document(content, response_headers)
+        
+        if not episodes:
             return None, []
         
         podcast_info = {
-            'collectionName': feed.feed.get('title', 'Unknown Podcast'),
-            'artistName': feed.feed.get('author', ''),
+            'collectionName': feed_info.get('title') or 'Unknown Podcast',
+            'artistName': feed_info.get('author', ''),
             'feedUrl': rss_url
         }
         
-        episodes = []
-        for entry in feed.entries:
-            audio_url = None
-            for enclosure in entry.get('enclosures', []):
-                if 'audio' in enclosure.get('type', ''):
-                    audio_url = enclosure.get('href')
-                    break
-            
-            if audio_url:
-                episodes.append({
-                    'trackName': entry.get('title', ''),
-                    'releaseDate': entry.get('published', ''),
-                    'episodeUrl': audio_url,
-                    'description': entry.get('summary', ''),
-                    'trackTimeMillis': 0  # RSS 中可能没有
-                })
+        if cache:
+            cache.record('miss')
+            cache.store(rss_url, content, resp.headers.get('ETag'),
+                        resp.headers.get('Last-Modified'), podcast_info, episodes, complete=complete)
         
         return podcast_info, episodes
     
     except Exception as e:
-        print(f"❌ RSS 解析失败: {e}")
+        _strategy_print(cancel, f"❌ RSS 解析失败: {e}")
         return None, []
+    finally:
+        if cancel is not None and resp is not None:
+            cancel.unregister(resp)
+
 
+def _part_paths(output_path):
+    """返回 (.part 临时文件, 续传校验信息文件) 路径"""
+    output_path = Path(output_path)
+    part_path = output_path.with_name(output_path.name + '.part')
+    state_path = output_path.with_name(output_path.name + '.part.json')
+    return part_path, state_path
 
-def download_audio(url, output_path, episode_title):
-    """下载音频文件"""
+
+def _load_resume_state(state_path, url):
+    """读取上次下载保存的 ETag / Last-Modified,URL 不一致时视为无效"""
     try:
-        print(f"   ⬇️  正在下载: {episode_title}")
-        response = requests.get(url, stream=True, timeout=60, headers={
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
-        response.raise_for_status()
-        
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded = 0
-        
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0:
-                        progress = (downloaded / total_size) * 100
-                        mb_downloaded = downloaded / 1024 / 1024
-                        mb_total = total_size / 1024 / 1024
-                        print(f"\r   进度: {progress:.1f}% ({mb_downloaded:.1f}/{mb_total:.1f} MB)", end='', flush=True)
-        
-        print()
-        return True
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('url') != url:
+        return None
+    return state
+
+
+def parse_fsync_policy(value):
+    """
+    fsync 策略: 'none' (交给操作系统)、'end' (完成后同步一次)
+    或大小字符串如 '64M' (每写入该字节数同步一次)
+    返回 None / 'end' / 字节数
+    """
+    value = (value or 'none').strip().lower()
+    if value == 'none':
+        return None
+    if value == 'end':
+        return 'end'
+    interval = parse_rate(value)
+    if not interval:
+        raise argparse.ArgumentTypeError(f"无效的 fsync 策略: {value}")
+    return interval
+
+
+def _read_chunks(response, bandwidth=None):
+    """
+    从响应流读取数据到可复用的预分配缓冲区,逐块产出 memoryview (调用方需在下一次迭代前用完)
+    块大小从 MIN_CHUNK_SIZE 开始: 读取很快就翻倍,读取变慢则减半,
+    避免高速链路上每 8 KB 一次的 Python 循环,同时保证低速时进度及时刷新。
+    响应有 Content-Encoding 时需要解压,退回 iter_content
+    """
+    encoding = response.headers.get('Content-Encoding', 'identity').lower()
+    if encoding not in ('', 'identity'):
+        for chunk in response.iter_content(chunk_size=MIN_CHUNK_SIZE):
+            if chunk:
+                yield memoryview(chunk)
+        return
     
-    except Exception as e:
-        print(f"\n   ❌ 下载失败: {e}")
-        return False
+    buffer = bytearray(MAX_CHUNK_SIZE)
+    view = memoryview(buffer)
+    chunk_size = MIN_CHUNK_SIZE
+    raw = response.raw
+    while True:
+        limit = chunk_size
+        if bandwidth is not None and bandwidth.rate:
+            # 限速时每块不超过 1/4 秒的额度,保持节流平滑
+            limit = max(MIN_CHUNK_SIZE, min(chunk_size, bandwidth.rate // 4))
+        started = time.monotonic()
+        n = raw.readinto(view[:limit])
+        if not n:
+            break
+        elapsed = time.monotonic() - started
+        if n == limit and elapsed < 0.05:
+            chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+        elif elapsed > 0.5:
+            chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+        yield view[:n]
+
 
+def _preallocate(fd, offset, length):
+    """预分配磁盘空间 (减少碎片并尽早发现空间不足),不支持时退化为扩展文件长度"""
+    if length <= 0:
+        return
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, offset, length)
+            return
+        except OSError:
+            pass
+    if os.fstat(fd).st_size < offset + length:
+        os.ftruncate(fd, offset + length)
 
-def download_from_apple_url(apple_url, output_dir='.', download_count=None):
+
+def _probe_remote(session, url, headers):
     """
-    从 Apple Podcast URL 下载节目
+    通过 HEAD 请求获取远程文件信息,不传输音频数据
+    返回: {'size', 'accept_ranges', 'etag', 'last_modified'} 或 None
     """
-    print(f"🎙️  Apple Podcast 下载器 (API 增强版)")
-    print(f"=" * 50)
+    try:
+        resp = session.head(url, allow_redirects=True, timeout=15, headers=headers)
+        resp.raise_for_status()
+        return {
+            'size': int(resp.headers.get('content-length', 0)),
+            'accept_ranges': resp.headers.get('Accept-Ranges', '').lower() == 'bytes',
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified')
+        }
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def _download_segmented(session, url, output_path, tracker, remote, segments, headers,
+                        bandwidth=None, fsync_policy=None):
+    """
+    分段并发下载单个大文件
+    预分配 .part 文件,每个分段用 Range 请求下载并直接 pwrite 到对应偏移,
+    已完成的分段记录在 .part.json 中,中断后只重新下载未完成的分段
+    """
+    part_path, state_path = _part_paths(output_path)
+    total_size = remote['size']
     
-    # 1. 解析 URL
-    podcast_id, episode_id, country_code = extract_podcast_info(apple_url)
+    state = _load_resume_state(state_path, url)
+    ranges = None
+    if (state and state.get('segments') and state.get('total_size') == total_size
+            and state.get('etag') == remote['etag'] and part_path.exists()):
+        ranges = state['segments']
+    if ranges is None:
+        segment_size = -(-total_size // segments)
+        ranges = [[start, min(start + segment_size, total_size) - 1, False]
+                  for start in range(0, total_size, segment_size)]
     
-    if not podcast_id:
-        print("❌ 无法解析 Podcast ID,请检查链接格式")
-        return False
+    state_lock = threading.Lock()
+    already_done = sum(end - start + 1 for start, end, done in ranges if done)
     
-    print(f"🌍 商店地区: {country_code.upper()}")
-    print(f"📂 Podcast ID: {podcast_id}")
-    if episode_id:
-        print(f"🎯 单集 ID: {episode_id}")
+    def save_state():
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': url,
+                'etag': remote['etag'],
+                'last_modified': remote['last_modified'],
+                'total_size': total_size,
+                'segments': ranges
+            }, f)
     
-    # 2. 获取信息
-    podcast_info = None
-    episodes = []
-    target_episode = None
+    def fetch_segment(segment, fd):
+        start, end, _ = segment
+        seg_headers = dict(headers)
+        seg_headers['Range'] = f'bytes={start}-{end}'
+        if remote['etag'] or remote['last_modified']:
+            seg_headers['If-Range'] = remote['etag'] or remote['last_modified']
+        with session.get(url, stream=True, timeout=60, headers=seg_headers) as resp:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise IOError("服务器未返回分段内容 (文件可能已变化)")
+            offset = start
+            for chunk in _read_chunks(resp, bandwidth):
+                # 直接写入对应偏移,无需拼接分段文件;pwrite 可能只写入一部分,循环写完整块
+                view = memoryview(chunk)
+                while view:
+                    written = os.pwrite(fd, view, offset)
+                    view = view[written:]
+                    offset += written
+                tracker.advance(len(chunk))
+                if bandwidth is not None:
+                    bandwidth.throttle(url, len(chunk))
+        if offset != end + 1:
+            raise IOError(f"分段 {start}-{end} 不完整")
+        with state_lock:
+            segment[2] = True
+            save_state()
     
-    # 场景 1: 有单集 ID,直接获取该单集
-    if episode_id:
-        print(f"\n正在查询指定单集...")
-        target_episode = fetch_episode_by_id(episode_id, country_code)
-        
-        if not target_episode:
-            # 从列表中搜索
-            print("⚠️  直接查询失败,尝试从列表中搜索...")
-            podcast_info, episodes = fetch_episodes_via_api(podcast_id, country_code)
-            target_episode = next((e for e in episodes if str(e.get('trackId')) == str(episode_id)), None)
+    tracker.start(total_size, resumed_from=already_done, segments=len(ranges))
+    
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        # 预分配文件空间
+        if os.fstat(fd).st_size != total_size:
+            os.ftruncate(fd, 0)
+            _preallocate(fd, 0, total_size)
+        save_state()
         
-        if target_episode:
-            episodes = [target_episode]
-            if not podcast_info:
-                podcast_info = {'collectionName': target_episode.get('collectionName', 'Unknown')}
+        pending = [segment for segment in ranges if not segment[2]]
+        with ThreadPoolExecutor(max_workers=len(pending) or 1) as executor:
+            futures = [executor.submit(fetch_segment, segment, fd) for segment in pending]
+            for future in as_completed(futures):
+                future.result()
+        if fsync_policy is not None:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
     
-    # 场景 2: 获取播客的节目列表
-    if not episodes:
-        podcast_info, episodes = fetch_episodes_via_api(podcast_id, country_code)
+    part_path.replace(output_path)
+    state_path.unlink(missing_ok=True)
+    tracker.done()
+    return True
+
+
+class StreamDigest:
+    """
+    下载过程中随数据流更新的完整性信息: SHA-256 摘要和字节数
+    可作为 download_audio 的 hasher 传入,下载结束后即为整个文件的摘要,无需再读一遍文件
+    """
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def update(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+
+def _hash_file(path, hasher, limit=None):
+    """把文件内容 (或前 limit 字节) 送入 hasher"""
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            size = MAX_CHUNK_SIZE if remaining is None else min(MAX_CHUNK_SIZE, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+
+def download_audio(url, output_path, episode_title, progress=None, segments=1, session=None,
+                   bandwidth=None, fsync_policy=None, hasher=None):
+    """
+    下载音频文件 (支持断点续传)
+    数据先写入 .part 文件,续传时通过 Range + If-Range (ETag/Last-Modified) 校验,
+    完成后原子重命名为目标文件
+    progress: ProgressReporter,默认输出到终端 (见 create_progress_reporter)
+    segments: 大于 1 且服务器支持 Range 时,分段并发下载单个文件
+    session: 共享的 HTTP 会话 (见 create_session)
+    bandwidth: 共享的 BandwidthLimiter,所有并发传输从同一个令牌桶取额度
+    fsync_policy: None / 'end' / 字节数 (见 parse_fsync_policy)
+    hasher: hashlib 对象,下载过程中随数据流更新 (续传时先读入已有部分),结束后即为整个文件的摘要
+    """
+    session = get_session(session)
+    output_path = Path(output_path)
+    part_path, state_path = _part_paths(output_path)
+    headers = {}
+    if progress is None:
+        progress = create_progress_reporter()
+    tracker = progress.track(episode_title, output_path.name)
     
-    # 场景 3: API 失败,尝试 RSS
-    if not episodes:
-        print("⚠️  API 方法失败,尝试 RSS Feed...")
-        rss_url = get_rss_feed_url(podcast_id, country_code)
-        if rss_url:
-            podcast_info, episodes = parse_rss_feed(rss_url)
+    try:
+        remote = None
+        if output_path.exists() or segments > 1:
+            remote = _probe_remote(session, url, headers)
+        
+        if output_path.exists() and remote and remote['size'] > 0 \
+                and remote['size'] == output_path.stat().st_size:
+            if hasher is not None:
+                _hash_file(output_path, hasher)
+            tracker.skip('文件已完整,跳过下载')
+            return True
+        
+        if segments > 1 and remote and remote['accept_ranges'] and hasattr(os, 'pwrite'):
+            segments = min(segments, remote['size'] // MIN_SEGMENT_SIZE)
+            if segments > 1:
+                ok = _download_segmented(session, url, output_path, tracker, remote,
+                                         segments, headers, bandwidth, fsync_policy)
+                # 分段乱序写入,无法边下边算 (SHA-256 不能由各段摘要合并): 完成后把整个文件再读一遍
+                if ok and hasher is not None:
+                    _hash_file(output_path, hasher)
+                return ok
+        
+        # 断点续传: 仅在有校验信息时才发送 Range,避免拼接不同版本的文件
+        resume_from = 0
+        state = _load_resume_state(state_path, url)
+        if part_path.exists() and state and (state.get('etag') or state.get('last_modified')):
+            resume_from = part_path.stat().st_size
+        if resume_from > 0:
+            headers['Range'] = f'bytes={resume_from}-'
+            headers['If-Range'] = state.get('etag') or state.get('last_modified')
+        
+        response = session.get(url, stream=True, timeout=60, headers=headers)
+        
+        if response.status_code == 416:
+            # 已有部分不可用 (通常是文件已变化),从头下载
+            response.close()
+            headers.pop('Range', None)
+            headers.pop('If-Range', None)
+            resume_from = 0
+            response = session.get(url, stream=True, timeout=60, headers=headers)
+        response.raise_for_status()
+        
+        if response.status_code == 206:
+            mode = 'r+b'
+            downloaded = resume_from
+        else:
+            # 服务器返回完整内容 (不支持 Range 或校验失败),重新开始
+            mode = 'wb'
+            downloaded = 0
+        
+        content_length = int(response.headers.get('content-length', 0))
+        total_size = downloaded + content_length if content_length else 0
+        tracker.start(total_size, resumed_from=downloaded)
+        
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'total_size': total_size
+            }, f)
+        
+        with open(part_path, mode, buffering=0) as f:
+            if hasher is not None and downloaded:
+                _hash_file(part_path, hasher, limit=downloaded)
+            f.seek(downloaded)
+            if total_size:
+                _preallocate(f.fileno(), downloaded, total_size - downloaded)
+            unsynced = 0
+            try:
+                for chunk in _read_chunks(response, bandwidth):
+                    # 无缓冲文件的 write 可能只写入一部分,循环写完整块
+                    view = memoryview(chunk)
+                    while view:
+                        view = view[f.write(view):]
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    downloaded += len(chunk)
+                    tracker.advance(len(chunk))
+                    if bandwidth is not None:
+                        bandwidth.throttle(url, len(chunk))
+                    if isinstance(fsync_policy, int):
+                        unsynced += len(chunk)
+                        if unsynced >= fsync_policy:
+                            os.fsync(f.fileno())
+                            unsynced = 0
+            finally:
+                # 去掉预分配但未写入的部分,保证 .part 的长度就是已下载字节数 (续传依赖这一点)
+                f.truncate(downloaded)
+            if fsync_policy is not None:
+                os.fsync(f.fileno())
+        
+        if total_size and downloaded < total_size:
+            raise IOError(f"连接中断,已下载 {downloaded}/{total_size} 字节 (可重新运行以续传)")
+        
+        part_path.replace(output_path)
+        state_path.unlink(missing_ok=True)
+        tracker.done()
+        return True
+    
+    except Exception as e:
+        tracker.error(str(e))
+        return False
+
+
+class AudioStore:
+    """
+    内容寻址的音频库
+    音频按下载时计算的 SHA-256 存放在 objects/<前两位>/<摘要>,另有 URL → 摘要的 SQLite 索引;
+    Podcast/NNN - 标题.ext 只是指向库中文件的硬链接。
+    节目改名或单集编号变化时,已下载过的链接直接重新硬链接,不再重复下载和占用空间
+    """
+
+    def __init__(self, store_dir):
+        self.root = Path(store_dir).expanduser()
+        self.objects_dir = self.root / 'objects'
+        self.staging_dir = self.root / 'tmp'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / 'index.sqlite3'
+        self._warned_copy = False
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS urls (
+                    url_key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def object_path(self, digest):
+        return self.objects_dir / digest[:2] / digest
+
+    def lookup(self, url):
+        """返回该音频链接已入库的摘要,库中文件缺失或大小不符时返回 None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT digest, size FROM urls WHERE url_key=?",
+                               (_audio_url_key(url),)).fetchone()
+        if not row:
+            return None
+        blob = self.object_path(row[0])
+        try:
+            if blob.stat().st_size != row[1]:
+                return None
+        except OSError:
+            return None
+        return row[0]
+
+    def staging_path(self, url):
+        """下载中的临时文件 (与库在同一文件系统,入库只需重命名;.part 续传照常工作)"""
+        ext = Path(urlparse(url).path).suffix or '.m4a'
+        name = hashlib.sha1(_audio_url_key(url).encode('utf-8')).hexdigest()
+        return self.staging_dir / f"{name}{ext}"
+
+    def add(self, url, path, digest):
+        """把下载完成的文件移入库中 (内容已存在则丢弃副本),并记录 URL → 摘要"""
+        blob = self.object_path(digest)
+        blob.parent.mkdir(exist_ok=True)
+        path = Path(path)
+        if blob.exists():
+            if not blob.samefile(path):
+                path.unlink()
+        else:
+            os.replace(path, blob)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url_key, digest, size, stored_at) VALUES (?, ?, ?, ?)",
+                (_audio_url_key(url), digest, blob.stat().st_size, time.time())
+            )
+        return blob
+
+    def link(self, digest, output_path):
+        """在 output_path 创建指向库中文件的硬链接 (跨文件系统等无法硬链接时退化为复制)"""
+        blob = self.object_path(digest)
+        output_path = Path(output_path)
+        if output_path.exists():
+            if output_path.samefile(blob):
+                return
+            output_path.unlink()
+        try:
+            os.link(blob, output_path)
+        except OSError as e:
+            if not self._warned_copy:
+                print(f"⚠️  无法创建硬链接 ({e}),改为复制文件")
+                self._warned_copy = True
+            shutil.copy2(blob, output_path)
+
+
+def download_to_store(store, url, output_path, episode_title, progress=None, hasher=None, **kwargs):
+    """
+    经内容寻址库下载: 链接已入库则直接硬链接,否则下载到库的临时区,
+    边下载边计算摘要,入库后再硬链接到 output_path
+    output_path 已有完整文件 (启用库之前下载的) 时直接校验大小并收编入库
+    hasher: 可选的 StreamDigest,用于同时取得字节数;其余参数透传给 download_audio
+    """
+    if progress is None:
+        progress = create_progress_reporter()
+    digest = store.lookup(url)
+    if digest:
+        store.link(digest, output_path)
+        progress.track(episode_title, Path(output_path).name).skip('内容库中已有,已创建硬链接')
+        return True
+    
+    target = Path(output_path) if Path(output_path).exists() else store.staging_path(url)
+    hasher = hasher if hasher is not None else hashlib.sha256()
+    if not download_audio(url, target, episode_title, progress=progress, hasher=hasher, **kwargs):
+        return False
+    digest = hasher.hexdigest()
+    store.add(url, target, digest)
+    store.link(digest, output_path)
+    return True
+
+
+def episode_identity(episode):
+    """
+    单集的稳定标识: 优先 GUID (API 与 RSS 一致),其次 trackId,最后是去掉查询参数的音频链接
+    """
+    guid = episode.get('episodeGuid')
+    if guid:
+        return f"guid:{guid}"
+    if episode.get('trackId'):
+        return f"track:{episode['trackId']}"
+    audio_url = episode.get('episodeUrl') or episode.get('previewUrl')
+    if audio_url:
+        return f"url:{_audio_url_key(audio_url)}"
+    return None
+
+
+def _audio_url_key(audio_url):
+    """音频链接去掉协议和查询参数 (同一文件常带不同的统计参数)"""
+    parsed = urlparse(audio_url)
+    return f"{parsed.netloc.lower()}{parsed.path}"
+
+
+class EpisodeIndex:
+    """
+    按 trackId / GUID / 音频链接建立的单集索引
+    查找和去重都是 O(1),替代对单集列表的线性扫描
+    """
+
+    def __init__(self, episodes=()):
+        self.episodes = []
+        self._by_key = {}
+        for episode in episodes:
+            self.add(episode)
+
+    @staticmethod
+    def keys(episode):
+        if episode.get('trackId'):
+            yield f"track:{episode['trackId']}"
+        if episode.get('episodeGuid'):
+            yield f"guid:{episode['episodeGuid']}"
+        audio_url = episode.get('episodeUrl') or episode.get('previewUrl')
+        if audio_url:
+            yield f"url:{_audio_url_key(audio_url)}"
+
+    def find(self, episode):
+        for key in self.keys(episode):
+            found = self._by_key.get(key)
+            if found is not None:
+                return found
+        return None
+
+    def get_track(self, track_id):
+        return self._by_key.get(f"track:{track_id}")
+
+    def add(self, episode):
+        """
+        加入单集;已存在时只补全缺失字段 (先加入的来源优先)
+        返回是否为新单集
+        """
+        existing = self.find(episode)
+        target = existing if existing is not None else episode
+        if existing is not None:
+            for field, value in episode.items():
+                if value and not existing.get(field):
+                    existing[field] = value
+        else:
+            self.episodes.append(episode)
+        for key in self.keys(target):
+            self._by_key.setdefault(key, target)
+        return existing is None
+
+    def __len__(self):
+        return len(self.episodes)
+
+
+def _release_timestamp(episode):
+    """解析发布时间 (API 为 ISO 8601,RSS 为 RFC 822),无法解析时返回 0"""
+    value = episode.get('releaseDate') or ''
+    try:
+        if value[:4].isdigit():
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        else:
+            parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def merge_catalogue(api_episodes, rss_episodes):
+    """
+    合并 API 与 RSS 的单集列表,按 GUID / 音频链接去重 (API 数据优先),
+    按发布时间从新到旧排序
+    """
+    index = EpisodeIndex(api_episodes)
+    for episode in rss_episodes:
+        index.add(episode)
+    return sorted(index.episodes, key=_release_timestamp, reverse=True)
+
+
+class DownloadManifest:
+    """
+    播客目录下的下载清单 (.manifest.json),用于增量同步
+    以单集稳定标识记录编号和文件名: 编号首次分配后不再变化,
+    新单集按发布顺序 (旧 -> 新) 依次获得下一个编号
+    首次建立清单时认领目录中已有的 "NNN - 标题.ext" 文件 (普通模式的下载结果),沿用其编号而不重复下载
+    """
+
+    FILENAME = '.manifest.json'
+    EXISTING_FILE_PATTERN = re.compile(r'(\d{3,}) - (.+)$')
+
+    def __init__(self, podcast_dir):
+        self.path = Path(podcast_dir) / self.FILENAME
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.episodes = data.get('episodes', {})
+        self.next_number = data.get('next_number', 1)
+        self._adopt = not data
+
+    def save(self):
+        with self._lock:
+            _atomic_write_json(self.path, {
+                'version': 1,
+                'next_number': self.next_number,
+                'episodes': self.episodes
+            })
+
+    def plan(self, episodes):
+        """
+        为单集列表 (新 -> 旧) 分配稳定编号
+        返回: [(number, episode, on_disk), ...],顺序与输入一致
+        """
+        if self._adopt:
+            self._adopt = False
+            self._adopt_existing(episodes)
+        
+        planned = {}
+        for episode in reversed(episodes):
+            identity = episode_identity(episode)
+            entry = self.episodes.get(identity) if identity else None
+            if entry is None:
+                number = self.next_number
+                self.next_number += 1
+                if identity:
+                    self.episodes[identity] = {'number': number, 'filename': None}
+            else:
+                number = entry['number']
+            planned[id(episode)] = number
+        
+        result = []
+        for episode in episodes:
+            identity = episode_identity(episode)
+            entry = self.episodes.get(identity) if identity else None
+            filename = entry.get('filename') if entry else None
+            on_disk = bool(filename) and (self.path.parent / filename).exists()
+            result.append((planned[id(episode)], episode, on_disk))
+        return result
+
+    def _adopt_existing(self, episodes):
+        """
+        按文件名 (去掉编号前缀) 把已有文件登记到对应单集,新编号从已有的最大编号之后开始
+        认领的文件保留普通模式的编号 (新 -> 旧),之后的新单集按 旧 -> 新 编号,两段顺序相反,认领时给出提示
+        """
+        if not self.path.parent.is_dir():
+            # 尚未下载过的播客 (--plan 时不会创建目录),没有可认领的文件
+            return
+        existing = {}
+        for path in self.path.parent.iterdir():
+            match = self.EXISTING_FILE_PATTERN.match(path.name)
+            if not match or not path.is_file() or path.suffix in ('.json', '.part'):
+                continue
+            number = int(match.group(1))
+            existing.setdefault(match.group(2), []).append((number, path.name))
+            self.next_number = max(self.next_number, number + 1)
+        for candidates in existing.values():
+            # 同名单集: 普通模式下最新一集编号最小,按 旧 -> 新 依次认领
+            candidates.sort(reverse=True)
+        
+        adopted = 0
+        for episode in reversed(episodes):
+            identity = episode_identity(episode)
+            if not identity or identity in self.episodes:
+                continue
+            task = build_episode_task(0, episode, self.path.parent)
+            if not task['filename']:
+                continue
+            candidates = existing.get(task['filename'].split(' - ', 1)[1])
+            if candidates:
+                number, filename = candidates.pop(0)
+                self.episodes[identity] = {
+                    'number': number,
+                    'filename': filename,
+                    'title': task['title'],
+                    'audio_url': task['audio_url']
+                }
+                adopted += 1
+        if adopted:
+            print(f"⚠️  已认领 {adopted} 个已有文件并沿用原编号 (普通模式按 新 -> 旧 编号);"
+                  f"之后的新单集从 {self.next_number:03d} 起按 旧 -> 新 编号")
+
+    def mark_downloaded(self, task):
+        identity = episode_identity(task['episode'])
+        if not identity:
+            return
+        with self._lock:
+            self.episodes[identity] = {
+                'number': task['idx'],
+                'filename': task['filename'],
+                'title': task['title'],
+                'audio_url': task['audio_url'],
+                'downloaded_at': datetime.now().isoformat()
+            }
+        self.save()
+
+
+class Catalog:
+    """
+    输出目录下的下载目录 (catalog.sqlite3),替代每集一个的 JSON 元数据文件
+    每个播客一行 (以目录名为键),每个单集一行 (播客 + 单集稳定标识为键),
+    记录发布日期、时长、文件路径 (相对输出目录)、大小、摘要和下载链接;每次写入都在单个事务中完成
+    """
+
+    FILENAME = 'catalog.sqlite3'
+
+    def __init__(self, root, path=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path = Path(path) if path else self.root / self.FILENAME
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS podcasts (
+                    folder TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    artist TEXT,
+                    country TEXT,
+                    feed_url TEXT,
+                    source TEXT,
+                    resolve_ms INTEGER,
+                    total_episodes INTEGER,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS episodes (
+                    folder TEXT NOT NULL REFERENCES podcasts(folder),
+                    identity TEXT NOT NULL,
+                    number INTEGER,
+                    title TEXT NOT NULL,
+                    release_date TEXT,
+                    duration_minutes INTEGER,
+                    description TEXT,
+                    file_path TEXT NOT NULL,
+                    size INTEGER,
+                    digest TEXT,
+                    audio_url TEXT,
+                    downloaded_at TEXT NOT NULL,
+                    PRIMARY KEY (folder, identity)
+                );
+                CREATE INDEX IF NOT EXISTS episodes_release ON episodes (release_date);
+                CREATE INDEX IF NOT EXISTS episodes_digest ON episodes (digest);
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _relative(self, path):
+        path = Path(path)
+        try:
+            return str(path.resolve().relative_to(self.root.resolve()))
+        except ValueError:
+            return str(path)
+
+    def record_podcast(self, folder, metadata):
+        """写入或更新播客信息,metadata 与旧版 podcast_info.json 字段一致"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO podcasts (folder, name, artist, country, feed_url, source, "
+                "resolve_ms, total_episodes, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (folder, metadata['podcast_name'], metadata.get('artist'), metadata.get('country'),
+                 metadata.get('feed_url'), metadata.get('source'), metadata.get('resolve_ms'),
+                 metadata.get('total_episodes'), metadata.get('download_date') or datetime.now().isoformat())
+            )
+
+    def record_episode(self, folder, task):
+        """
+        下载成功后记录单集 (同一单集重复下载时覆盖旧记录)
+        本次未计算摘要 (文件已存在而跳过) 时保留已记录的摘要和大小
+        """
+        file_path = Path(task['file_path'])
+        size = task.get('size')
+        if size is None and file_path.exists():
+            size = file_path.stat().st_size
+        identity = episode_identity(task['episode']) or f"file:{task['filename']}"
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO episodes (folder, identity, number, title, release_date, "
+                "duration_minutes, description, file_path, size, digest, audio_url, downloaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (folder, identity) DO UPDATE SET number = excluded.number, "
+                "title = excluded.title, release_date = excluded.release_date, "
+                "duration_minutes = excluded.duration_minutes, description = excluded.description, "
+                "file_path = excluded.file_path, audio_url = excluded.audio_url, "
+                "downloaded_at = excluded.downloaded_at, "
+                "size = CASE WHEN excluded.digest IS NULL THEN COALESCE(episodes.size, excluded.size) "
+                "ELSE excluded.size END, "
+                "digest = COALESCE(excluded.digest, episodes.digest)",
+                (folder, identity, task['idx'], task['title'], task['release_date'],
+                 task['duration_min'], task['episode'].get('description', ''),
+                 self._relative(file_path), size, task.get('digest'), task['audio_url'],
+                 datetime.now().isoformat())
+            )
+
+    def update_integrity(self, folder, identity, size, digest):
+        """verify 校验或重新下载后更新单集的大小和摘要"""
+        with self._connect() as conn:
+            conn.execute("UPDATE episodes SET size = ?, digest = ? WHERE folder = ? AND identity = ?",
+                         (size, digest, folder, identity))
+
+    def query(self, podcast=None, since=None, until=None, search=None, limit=None):
+        """
+        按条件列出单集 (发布日期从新到旧)
+        podcast: 播客名或目录名包含的文字;since / until: 发布日期范围 (YYYY-MM-DD);
+        search: 标题或简介包含的文字
+        """
+        sql = ("SELECT e.*, p.name AS podcast_name FROM episodes e "
+               "JOIN podcasts p ON p.folder = e.folder WHERE 1=1")
+        params = []
+        if podcast:
+            sql += " AND (p.name LIKE ? OR p.folder LIKE ?)"
+            params += [f"%{podcast}%"] * 2
+        if since:
+            sql += " AND e.release_date >= ?"
+            params.append(since)
+        if until:
+            sql += " AND e.release_date <= ?"
+            params.append(until)
+        if search:
+            sql += " AND (e.title LIKE ? OR e.description LIKE ?)"
+            params += [f"%{search}%"] * 2
+        sql += " ORDER BY e.release_date DESC, e.folder, e.number DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def podcasts(self):
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT p.*, COUNT(e.identity) AS downloaded, COALESCE(SUM(e.size), 0) AS bytes "
+                "FROM podcasts p LEFT JOIN episodes e ON e.folder = p.folder "
+                "GROUP BY p.folder ORDER BY p.name")]
+
+    def export_sidecars(self, podcast=None):
+        """按旧版格式写出 podcast_info.json 和每集的 .json,返回写出的单集数"""
+        written = 0
+        for info in self.podcasts():
+            if podcast and podcast not in info['name'] and podcast not in info['folder']:
+                continue
+            podcast_dir = self.root / info['folder']
+            if not podcast_dir.is_dir():
+                continue
+            save_podcast_metadata(podcast_dir, {
+                'podcast_name': info['name'],
+                'artist': info['artist'] or '',
+                'country': info['country'],
+                'total_episodes': info['total_episodes'],
+                'download_date': info['updated_at'],
+                'source': info['source'],
+                'resolve_ms': info['resolve_ms']
+            })
+            for row in self.query(podcast=info['folder']):
+                if row['folder'] != info['folder']:
+                    continue
+                file_path = self.root / row['file_path']
+                save_episode_metadata({
+                    'title': row['title'],
+                    'release_date': row['release_date'],
+                    'duration_min': row['duration_minutes'],
+                    'episode': {'description': row['description']},
+                    'filename': file_path.name,
+                    'file_path': file_path,
+                    'audio_url': row['audio_url'],
+                    'size': row['size'],
+                    'digest': row['digest']
+                })
+                written += 1
+        return written
+
+    def import_sidecars(self):
+        """从旧版 JSON 文件导入 (升级前下载的目录),返回导入的单集数"""
+        imported = 0
+        for info_path in sorted(self.root.glob('*/podcast_info.json')):
+            podcast_dir = info_path.parent
+            try:
+                with open(info_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            metadata.setdefault('podcast_name', podcast_dir.name)
+            self.record_podcast(podcast_dir.name, metadata)
+            for meta_path in sorted(podcast_dir.glob('*.json')):
+                if meta_path.name == 'podcast_info.json':
+                    continue
+                try:
+                    with open(meta_path, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if not isinstance(meta, dict) or not meta.get('audio_file'):
+                    continue
+                number = meta['audio_file'].split(' - ', 1)[0]
+                self.record_episode(podcast_dir.name, {
+                    'idx': int(number) if number.isdigit() else None,
+                    'title': meta.get('title', ''),
+                    'release_date': meta.get('release_date', ''),
+                    'duration_min': meta.get('duration_minutes', 0),
+                    'episode': {'description': meta.get('description', ''),
+                                'episodeUrl': meta.get('download_url')},
+                    'filename': meta['audio_file'],
+                    'file_path': podcast_dir / meta['audio_file'],
+                    'audio_url': meta.get('download_url'),
+                    'size': meta.get('size'),
+                    'digest': meta.get('sha256')
+                })
+                imported += 1
+        return imported
+
+
+def _run_hedged(strategies, cancel):
+    """
+    并发执行多个获取策略,返回第一个有效结果
+    strategies: [(name, fn)],fn(cancel) 返回 (podcast_info, episodes)
+    cancel: CancelToken,由调用方在不再需要落选策略时设置;落选策略正在读取的响应被中断,且不再输出
+    返回: (name, result, latency_ms, pending),pending 为仍在运行的 {name: future};
+    全部失败时 name 为 None
+    策略运行在守护线程上: 卡住的请求不会阻塞进程退出 (线程池会在退出时等待所有线程)
+    """
+    started = time.monotonic()
+    futures = {}
+    for name, fn in strategies:
+        future = Future()
+        
+        def run(fn=fn, future=future):
+            try:
+                future.set_result(fn(cancel))
+            except Exception as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=run, name=f'hedged-{name}', daemon=True).start()
+        futures[future] = name
+    pending = {name: future for future, name in futures.items()}
+    for future in as_completed(futures):
+        name = futures[future]
+        pending.pop(name)
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+        if result and result[1]:
+            latency_ms = int((time.monotonic() - started) * 1000)
+            return name, result, latency_ms, pending
+    return None, (None, []), int((time.monotonic() - started) * 1000), {}
+
+
+def resolve_episodes(podcast_id, episode_id, country_code, download_count=None,
+                     session=None, lookup_cache=None, feed_cache=None):
+    """
+    并发获取节目信息,替代依次尝试的回退链:
+      - 有单集 ID 时: 单集直接查询 与 API 列表搜索 同时进行
+      - 否则 (或单集查找失败): API 列表 与 RSS Feed 同时进行
+    先返回有效结果的策略胜出,其余策略被取消 (中断请求、不再输出);各策略不打印进度提示,只输出胜出的来源
+    API 列表胜出但达到 200 集上限时,继续等待 RSS 结果用于补全目录
+    返回: {'podcast_info', 'episodes', 'source', 'latency_ms'}
+    """
+    lookup_cancel = CancelToken()
+    cancel = CancelToken()
+    
+    def episode_lookup(cancel):
+        episode = fetch_episode_by_id(episode_id, country_code, session=session, cache=lookup_cache,
+                                      cancel=cancel)
+        if not episode:
+            return None
+        return {'collectionName': episode.get('collectionName', 'Unknown')}, [episode]
+    
+    def api_list_search(cancel):
+        podcast_info, episodes = fetch_episodes_via_api(podcast_id, country_code, session=session,
+                                                        cache=lookup_cache, cancel=cancel)
+        episode = EpisodeIndex(episodes).get_track(episode_id)
+        if not episode:
+            return None
+        return podcast_info or {'collectionName': episode.get('collectionName', 'Unknown')}, [episode]
+    
+    def api_list(cancel):
+        return fetch_episodes_via_api(podcast_id, country_code, session=session, cache=lookup_cache,
+                                      cancel=cancel)
+    
+    def rss(cancel):
+        rss_url = get_rss_feed_url(podcast_id, country_code, session=session, cache=lookup_cache,
+                                   cancel=cancel)
+        if not rss_url or cancel.is_set():
+            return None
+        return parse_rss_feed(rss_url, session=session, cache=feed_cache, limit=download_count,
+                              cancel=cancel)
+    
+    total_ms = 0
+    try:
+        if episode_id:
+            print(f"\n正在查询指定单集...")
+            source, result, latency_ms, _ = _run_hedged([
+                ('episode_lookup', episode_lookup),
+                ('api_list_search', api_list_search)
+            ], lookup_cancel)
+            lookup_cancel.set()
+            total_ms += latency_ms
+            if source:
+                print(f"🏁 数据来源: {source} ({latency_ms} ms)")
+                return {'podcast_info': result[0], 'episodes': result[1],
+                        'source': source, 'latency_ms': total_ms}
+            print("⚠️  未找到指定单集,改为获取节目列表...")
+        
+        print("📡 正在获取节目列表 (API 与 RSS Feed 并发)...")
+        source, result, latency_ms, pending = _run_hedged([('api_list', api_list), ('rss', rss)], cancel)
+        total_ms += latency_ms
+        podcast_info, episodes = result
+        
+        # API 结果达到 200 集上限且需要更多单集时,用 RSS 结果补全更早的节目
+        if (source == 'api_list' and 'rss' in pending and len(episodes) >= API_EPISODE_LIMIT
+                and (not download_count or download_count > len(episodes))):
+            started = time.monotonic()
+            try:
+                rss_result = pending['rss'].result()
+            except Exception:
+                rss_result = None
+            total_ms += int((time.monotonic() - started) * 1000)
+            if rss_result and rss_result[1]:
+                merged = merge_catalogue(episodes, rss_result[1])
+                print(f"📚 合并目录: API {len(episodes)} 集 + RSS {len(rss_result[1])} 集"
+                      f" -> 共 {len(merged)} 集")
+                episodes = merged
+                source = 'api_list+rss'
+        
+        if source:
+            print(f"🏁 数据来源: {source} ({total_ms} ms)")
+        return {'podcast_info': podcast_info, 'episodes': episodes,
+                'source': source, 'latency_ms': total_ms}
+    finally:
+        lookup_cancel.set()
+        cancel.set()
+
+
+def build_episode_task(idx, episode, output_path):
+    """
+    根据单集信息生成下载任务 (文件名在提交前确定,保证编号稳定)
+    """
+    title = episode.get('trackName', f'Episode {idx}')
+    # API 为 ISO 8601,RSS 为 RFC 822,统一为 YYYY-MM-DD
+    timestamp = _release_timestamp(episode)
+    if timestamp:
+        release_date = datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+    else:
+        release_date = episode.get('releaseDate', '')[:10]
+    audio_url = episode.get('episodeUrl') or episode.get('previewUrl')
+    duration_ms = episode.get('trackTimeMillis', 0)
+    duration_min = int(duration_ms / 1000 / 60) if duration_ms else 0
+    
+    task = {
+        'idx': idx,
+        'episode': episode,
+        'title': title,
+        'release_date': release_date,
+        'audio_url': audio_url,
+        'duration_min': duration_min,
+        'filename': None,
+        'file_path': None
+    }
+    
+    if audio_url:
+        # 确定文件扩展名
+        parsed_url = urlparse(audio_url)
+        ext = Path(parsed_url.path).suffix or '.m4a'
+        
+        # 生成文件名
+        task['filename'] = f"{idx:03d} - {sanitize_filename(title)}{ext}"
+        task['file_path'] = output_path / task['filename']
+    
+    return task
+
+
+def save_podcast_metadata(output_path, metadata):
+    """写出旧版的 podcast_info.json (--sidecars 或导出时使用)"""
+    with open(Path(output_path) / 'podcast_info.json', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+
+def save_episode_metadata(task):
+    """写出旧版的单集元数据 JSON (--sidecars 或导出时使用)"""
+    episode_meta = {
+        'title': task['title'],
+        'release_date': task['release_date'],
+        'duration_minutes': task['duration_min'],
+        'description': task['episode'].get('description', ''),
+        'audio_file': task['filename'],
+        'download_url': task['audio_url']
+    }
+    if task.get('digest'):
+        episode_meta['size'] = task.get('size')
+        episode_meta['sha256'] = task['digest']
+    with open(task['file_path'].with_suffix('.json'), 'w', encoding='utf-8') as f:
+        json.dump(episode_meta, f, indent=2, ensure_ascii=False)
+
+
+def fetch_episode_audio(task, progress, store=None, **kwargs):
+    """
+    下载单集音频: 启用内容寻址库时经由库下载,否则直接写入目标文件
+    下载时同步计算 SHA-256 和字节数,记入 task['digest'] / task['size'];
+    目标文件已完整而跳过下载时,摘要由已有文件计算,目录中不会留下过期的摘要
+    """
+    task['digest'] = task['size'] = None
+    if store is not None:
+        digest = StreamDigest()
+        ok = download_to_store(store, task['audio_url'], task['file_path'], task['title'],
+                               progress=progress, hasher=digest, **kwargs)
+        if ok:
+            task['digest'] = store.lookup(task['audio_url'])
+            task['size'] = digest.size or None
+        return ok
+
+    digest = StreamDigest()
+    ok = download_audio(task['audio_url'], task['file_path'], task['title'],
+                        progress=progress, hasher=digest, **kwargs)
+    if ok and digest.size:
+        task['digest'], task['size'] = digest.hexdigest(), digest.size
+    return ok
+
+
+def download_episode_task(task, limiter, progress, segments=1, session=None, on_success=None,
+                          bandwidth=None, fsync_policy=None, store=None):
+    """
+    并发模式下的单集下载 (在线程池中执行)
+    on_success: 下载成功后调用 on_success(task) (记录目录、更新清单)
+    """
+    with limiter.slot(task['audio_url']):
+        ok = fetch_episode_audio(task, progress, store, segments=segments, session=session,
+                                 bandwidth=bandwidth, fsync_policy=fsync_policy)
+    if ok:
+        if on_success:
+            on_success(task)
+        progress.log(f"   ✅ [{task['idx']}] 已保存: {task['filename']}")
+    return ok
+
+
+def download_tasks_concurrently(tasks, jobs, per_host, segments=1, session=None, on_success=None,
+                                bandwidth=None, progress=None, fsync_policy=None, store=None):
+    """
+    使用线程池并发下载多个单集
+    progress: ProgressReporter,默认在终端显示汇总进度行
+    返回成功数量
+    """
+    limiter = HostLimiter(per_host)
+    if progress is None:
+        progress = create_progress_reporter(total_episodes=len(tasks), concurrent=True)
+    success_count = 0
+    
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(download_episode_task, task, limiter, progress, segments, session,
+                                   on_success, bandwidth, fsync_policy, store)
+                   for task in tasks]
+        try:
+            for future in as_completed(futures):
+                if future.result():
+                    success_count += 1
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            raise
+    
+    progress.close()
+    return success_count
+
+
+def probe_size(session, url):
+    """
+    获取远程音频大小: 先用 HEAD,HEAD 不可用或没有长度时
+    改用 Range: bytes=0-0 从 Content-Range 读取总大小 (只传输 1 字节)
+    返回字节数,无法确定时返回 None
+    """
+    remote = _probe_remote(session, url, {})
+    if remote and remote['size'] > 0:
+        return remote['size']
+    try:
+        resp = session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=15)
+        try:
+            total = resp.headers.get('Content-Range', '').rpartition('/')[2]
+            if resp.status_code == 206 and total.isdigit():
+                return int(total)
+            if resp.status_code == 200 and resp.headers.get('content-length', '').isdigit():
+                return int(resp.headers['content-length'])
+        finally:
+            resp.close()
+    except requests.RequestException:
+        pass
+    return None
+
+
+def _bytes_needed(task, size, store=None):
+    """还需要写入磁盘的字节数: 扣除已完整的文件、已有的 .part 和内容库中已有的音频"""
+    if size is None:
+        return None
+    if store is not None and store.lookup(task['audio_url']):
+        return 0
+    path = Path(task['file_path'])
+    if path.exists() and path.stat().st_size == size:
+        return 0
+    part_path, _ = _part_paths(path)
+    if part_path.exists():
+        return max(size - part_path.stat().st_size, 0)
+    return size
+
+
+def measure_throughput(session, urls, sample_size=2 * 1024 * 1024):
+    """
+    并发下载几个音频的前 sample_size 字节,估计单个连接的吞吐 (字节/秒)
+    无法测量时返回 None
+    """
+    def sample(url):
+        started = time.monotonic()
+        received = 0
+        with session.get(url, headers={'Range': f'bytes=0-{sample_size - 1}'}, stream=True,
+                         timeout=30) as resp:
+            resp.raise_for_status()
+            for chunk in resp.iter_content(chunk_size=MIN_CHUNK_SIZE):
+                received += len(chunk)
+                if received >= sample_size:
+                    break
+        return received, time.monotonic() - started
+    
+    rates = []
+    with ThreadPoolExecutor(max_workers=max(1, len(urls))) as executor:
+        for future in as_completed([executor.submit(sample, url) for url in urls]):
+            try:
+                received, elapsed = future.result()
+            except Exception:
+                continue
+            if received and elapsed > 0:
+                rates.append(received / elapsed)
+    return sum(rates) / len(rates) if rates else None
+
+
+def _free_space(path):
+    """输出路径所在文件系统的可用空间 (路径尚不存在时取最近的已存在父目录)"""
+    path = Path(path).resolve()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return shutil.disk_usage(path).free
+
+
+def plan_downloads(tasks, output_dir, session, jobs=1, store=None, limit_rate=None,
+                   min_free=DEFAULT_MIN_FREE, measure=False, probe_jobs=16):
+    """
+    下载前的预检: 并发获取每个音频的大小,汇总需要写入的字节数并与可用空间比较
+    measure 为 True 时额外测量吞吐并估计耗时 (--plan)
+    每个任务写入 task['size'] / task['bytes_needed'] (未知时为 None)
+    返回: {'total', 'needed', 'unknown', 'free', 'budget', 'fits', 'rate', 'eta'}
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(probe_jobs, len(tasks)))) as executor:
+        sizes = list(executor.map(lambda task: probe_size(session, task['audio_url']), tasks))
+    
+    for task, size in zip(tasks, sizes):
+        task['size'] = size
+        task['bytes_needed'] = _bytes_needed(task, size, store)
+    
+    known = [task for task in tasks if task['size'] is not None]
+    needed = sum(task['bytes_needed'] for task in known)
+    # 大小未知的单集按已知单集的平均大小估算
+    unknown = len(tasks) - len(known)
+    if unknown and known:
+        needed += unknown * sum(task['size'] for task in known) // len(known)
+    
+    free = _free_space(output_dir)
+    budget = free - (min_free or 0)
+    plan = {
+        'total': sum(task['size'] for task in known),
+        'needed': needed,
+        'unknown': unknown,
+        'free': free,
+        'budget': budget,
+        'fits': needed <= budget,
+        'rate': None,
+        'eta': None
+    }
+    
+    if measure and needed:
+        pending = [task['audio_url'] for task in tasks if task['bytes_needed']]
+        per_stream = measure_throughput(session, pending[:3])
+        if per_stream:
+            rate = per_stream * max(1, min(jobs, len(pending)))
+            if limit_rate:
+                rate = min(rate, limit_rate)
+            plan['rate'] = rate
+            plan['eta'] = needed / rate
+    return plan
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+    return f"{size:.2f} TB"
+
+
+def print_plan(plan, tasks):
+    """输出下载计划"""
+    print(f"\n📋 下载计划: {len(tasks)} 集")
+    for task in tasks:
+        size = _format_size(task['size']) if task['size'] is not None else '大小未知'
+        note = ''
+        if task['bytes_needed'] == 0:
+            note = ' (已存在)'
+        elif task['size'] and task['bytes_needed'] and task['bytes_needed'] < task['size']:
+            note = f" (续传 {_format_size(task['bytes_needed'])})"
+        print(f"   [{task['idx']}] {task['filename']}: {size}{note}")
+    print(f"   总大小: {_format_size(plan['total'])}"
+          + (f" (另有 {plan['unknown']} 集大小未知,按平均值估算)" if plan['unknown'] else ''))
+    print(f"   需写入: {_format_size(plan['needed'])} | 可用空间: {_format_size(plan['free'])}"
+          f" (保留 {_format_size(plan['free'] - plan['budget'])})")
+    if plan['eta'] is not None:
+        minutes, seconds = divmod(int(plan['eta']), 60)
+        hours, minutes = divmod(minutes, 60)
+        print(f"   预计耗时: {hours:d}:{minutes:02d}:{seconds:02d} (按实测 {format_rate(plan['rate'])})")
+    print(f"   {'✅ 空间充足' if plan['fits'] else '❌ 空间不足'}")
+
+
+def preflight(tasks, output_dir, session, jobs=1, store=None, limit_rate=None,
+              min_free=DEFAULT_MIN_FREE, plan_only=False, if_no_space='trim'):
+    """
+    下载前预检: plan_only 时输出完整计划并返回 None;
+    否则检查空间,返回可以下载的任务 (全部拒绝时返回 None)
+    """
+    runnable = [task for task in tasks if task['audio_url']]
+    if not runnable:
+        return None if plan_only else tasks
+    print(f"\n🔍 正在获取 {len(runnable)} 个音频的大小...")
+    plan = plan_downloads(runnable, output_dir, session, jobs, store, limit_rate, min_free,
+                          measure=plan_only)
+    if plan_only:
+        print_plan(plan, runnable)
+        return None
+    print(f"   需写入 {_format_size(plan['needed'])},可用 {_format_size(plan['free'])}")
+    admitted = admit_tasks(runnable, plan, if_no_space)
+    if not admitted:
+        return None
+    admitted_ids = {id(task) for task in admitted}
+    return [task for task in tasks if not task['audio_url'] or id(task) in admitted_ids]
+
+
+def admit_tasks(tasks, plan, policy='trim'):
+    """
+    空间不足时的处理: 'refuse' 返回空列表;'trim' 按顺序 (新 -> 旧) 保留放得下的单集
+    """
+    if plan['fits']:
+        return tasks
+    if policy == 'refuse':
+        print(f"❌ 需要 {_format_size(plan['needed'])},可用 {_format_size(max(plan['budget'], 0))},拒绝下载")
+        return []
+    average = plan['total'] // max(len(tasks) - plan['unknown'], 1)
+    admitted = []
+    used = 0
+    for task in tasks:
+        needed = task['bytes_needed'] if task['bytes_needed'] is not None else average
+        if used + needed <= plan['budget']:
+            admitted.append(task)
+            used += needed
+    print(f"✂️  空间不足,只下载其中 {len(admitted)}/{len(tasks)} 集 ({_format_size(used)})")
+    return admitted
+
+
+def download_from_apple_url(apple_url, output_dir='.', download_count=None, jobs=1, per_host=4,
+                            segments=1, pool_size=None, retries=3, cache_dir=None, use_cache=True,
+                            refresh=False, sync=False, limit_rate=None, per_host_rate=None,
+                            rate_control=None, progress_mode='human', progress_stream=None,
+                            fsync_policy=None, store_dir=None, catalog_path=None, sidecars=False,
+                            plan_only=False, space_check=False, min_free=DEFAULT_MIN_FREE,
+                            if_no_space='trim'):
+    """
+    从 Apple Podcast URL 下载节目
+    所有网络请求共用一个连接池会话,pool_size 默认按并发数估算
+    use_cache: 是否启用本地缓存 (iTunes 查询结果、RSS Feed 条件请求),cache_dir 默认 DEFAULT_CACHE_DIR
+    refresh: 忽略已缓存的 iTunes 查询结果,强制请求 API
+    sync: 增量同步,只下载清单中尚未下载的单集,文件编号跨次运行保持不变
+    limit_rate / per_host_rate: 全局 / 每主机带宽上限 (字节/秒),rate_control 为运行时调整用的控制文件
+    progress_mode: 'human' 为终端进度,'jsonl' 时把进度事件逐行写入 progress_stream
+    fsync_policy: 写入音频时的 fsync 策略 (见 parse_fsync_policy)
+    store_dir: 内容寻址音频库目录,设置后输出文件为指向库的硬链接 (见 AudioStore)
+    catalog_path: 下载目录数据库,默认 output_dir/catalog.sqlite3 (见 Catalog)
+    sidecars: 同时写出旧版的 podcast_info.json 和每集 .json
+    plan_only: 只输出下载计划 (大小、可用空间、预计耗时),不下载
+    space_check: 下载前逐个获取音频大小并检查磁盘空间 (每集多一次请求,默认关闭),
+                 不足时按 if_no_space ('trim' / 'refuse') 处理,min_free 为需要保留的空闲字节数
+    """
+    if pool_size is None:
+        pool_size = max(10, jobs * segments)
+    session = create_session(pool_size=pool_size, retries=retries)
+    lookup_cache = LookupCache(cache_dir, refresh=refresh) if use_cache else None
+    
+    print(f"🎙️  Apple Podcast 下载器 (API 增强版)")
+    print(f"=" * 50)
+    
+    # 1. 解析 URL
+    podcast_id, episode_id, country_code = extract_podcast_info(apple_url)
+    
+    if not podcast_id:
+        print("❌ 无法解析 Podcast ID,请检查链接格式")
+        return False
+    
+    print(f"🌍 商店地区: {country_code.upper()}")
+    print(f"📂 Podcast ID: {podcast_id}")
+    if episode_id:
+        print(f"🎯 单集 ID: {episode_id}")
+    
+    # 2. 获取信息 (多种方式并发,先返回有效结果者胜出)
+    feed_cache = FeedCache(cache_dir) if use_cache else None
+    resolution = resolve_episodes(podcast_id, episode_id, country_code, download_count,
+                                  session=session, lookup_cache=lookup_cache, feed_cache=feed_cache)
+    podcast_info, episodes = resolution['podcast_info'], resolution['episodes']
     
     if not episodes:
         print("❌ 无法获取任何节目信息")
@@ -263,7 +2533,8 @@ def download_from_apple_url(apple_url, output_dir='.', download_count=None):
     # 5. 创建输出目录
     podcast_folder = sanitize_filename(podcast_name)
     output_path = Path(output_dir) / podcast_folder
-    output_path.mkdir(parents=True, exist_ok=True)
+    if not plan_only:
+        output_path.mkdir(parents=True, exist_ok=True)
     
     # 保存播客元数据
     metadata = {
@@ -271,65 +2542,1000 @@ def download_from_apple_url(apple_url, output_dir='.', download_count=None):
         'artist': podcast_info.get('artistName', ''),
         'country': country_code,
         'total_episodes': len(episodes),
-        'download_date': datetime.now().isoformat()
+        'download_date': datetime.now().isoformat(),
+        'source': resolution['source'],
+        'resolve_ms': resolution['latency_ms'],
+        'feed_url': podcast_info.get('feedUrl')
     }
-    with open(output_path / 'podcast_info.json', 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    catalog = None
+    if not plan_only:
+        catalog = Catalog(output_dir, catalog_path)
+        catalog.record_podcast(podcast_folder, metadata)
+        if sidecars:
+            save_podcast_metadata(output_path, metadata)
     
     # 6. 下载节目
-    print(f"\n开始下载到: {output_path}")
+    print(f"\n{'下载计划' if plan_only else '开始下载到'}: {output_path}")
     print("=" * 50)
     
-    success_count = 0
-    for idx, episode in enumerate(episodes_to_download, 1):
-        title = episode.get('trackName', f'Episode {idx}')
-        release_date = episode.get('releaseDate', '')[:10]
-        audio_url = episode.get('episodeUrl') or episode.get('previewUrl')
-        duration_ms = episode.get('trackTimeMillis', 0)
-        duration_min = int(duration_ms / 1000 / 60) if duration_ms else 0
+    manifest = None
+    if sync:
+        manifest = DownloadManifest(output_path)
+        planned = manifest.plan(episodes_to_download)
+        if not plan_only:
+            manifest.save()
+        tasks = [build_episode_task(number, episode, output_path)
+                 for number, episode, on_disk in planned if not on_disk]
+        print(f"🔄 同步模式: 已下载 {len(planned) - len(tasks)} 集, 待下载 {len(tasks)} 集")
+    else:
+        tasks = [build_episode_task(idx, episode, output_path)
+                 for idx, episode in enumerate(episodes_to_download, 1)]
+    
+    def on_success(task):
+        catalog.record_episode(podcast_folder, task)
+        if sidecars:
+            save_episode_metadata(task)
+        if manifest:
+            manifest.mark_downloaded(task)
+    
+    store = None
+    if store_dir:
+        store = AudioStore(store_dir)
+        print(f"🗄️  内容寻址库: {store.root}")
+    
+    if plan_only or space_check:
+        tasks = preflight(tasks, output_path, session, jobs, store, limit_rate, min_free,
+                          plan_only, if_no_space)
+        if tasks is None:
+            return plan_only
+    
+    bandwidth = None
+    if limit_rate or per_host_rate or rate_control:
+        bandwidth = BandwidthLimiter(limit_rate, per_host_rate, rate_control)
+        print(f"🚦 限速: {format_rate(bandwidth.rate)} (每主机 {format_rate(bandwidth.per_host_rate)})")
+    
+    if jobs > 1:
+        print(f"⚡ 并发下载: {jobs} 个任务 (每个主机最多 {per_host} 个连接)")
+        for task in tasks:
+            if not task['audio_url']:
+                print(f"   ⚠️  [{task['idx']}] {task['title']}: 未找到音频链接,跳过")
+        runnable = [task for task in tasks if task['audio_url']]
+        progress = create_progress_reporter(progress_mode, len(runnable), concurrent=True,
+                                            stream=progress_stream)
+        success_count = download_tasks_concurrently(runnable, jobs, per_host, segments, session,
+                                                    on_success, bandwidth, progress, fsync_policy,
+                                                    store)
+    else:
+        progress = create_progress_reporter(progress_mode, len(tasks), stream=progress_stream)
+        success_count = 0
+        for position, task in enumerate(tasks, 1):
+            print(f"\n[{position}/{len(tasks)}] {task['title']}")
+            print(f"   📅 {task['release_date']} | ⏱️  {task['duration_min']} 分钟")
+            
+            if not task['audio_url']:
+                print("   ⚠️  未找到音频链接,跳过")
+                continue
+            
+            # 下载
+            if fetch_episode_audio(task, progress, store, segments=segments, session=session,
+                                   bandwidth=bandwidth, fsync_policy=fsync_policy):
+                success_count += 1
+                print(f"   ✅ 已保存: {task['filename']}")
+                on_success(task)
+        progress.close()
+    
+    # 7. 完成
+    print("\n" + "=" * 50)
+    print(f"✨ 下载完成!")
+    print(f"📂 输出目录: {output_path}")
+    print(f"✅ 成功: {success_count}/{len(tasks)} 集")
+    print(f"🗂️  下载目录: {catalog.path}")
+    if bandwidth is not None:
+        bandwidth.close()
+        print(f"📶 实际吞吐: {format_rate(bandwidth.throughput())}")
+    
+    if lookup_cache:
+        lookup_cache.wait()
+    
+    return True
+
+
+def read_batch_urls(source):
+    """读取批量链接: 文件路径或 '-' (标准输入),每行一个链接,# 开头为注释"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+
+def download_batch(urls, output_dir='.', download_count=None, jobs=4, per_host=4, segments=1,
+                   pool_size=None, retries=3, cache_dir=None, use_cache=True, refresh=False,
+                   sync=False, limit_rate=None, per_host_rate=None, rate_control=None,
+                   progress_mode='human', progress_stream=None, fsync_policy=None, store_dir=None,
+                   catalog_path=None, sidecars=False, plan_only=False, space_check=False,
+                   min_free=DEFAULT_MIN_FREE, if_no_space='trim'):
+    """
+    一次运行下载多个 Apple Podcast 链接
+    链接按 (podcast_id, 地区) 分组;单集链接用多 ID lookup 批量解析,
+    批量查询没有返回的单集再从该播客的 API 列表中查找;播客链接按 download_count 获取最新单集。
+    所有单集由同一个线程池调度下载 (jobs 个任务,每个主机最多 per_host 个连接)
+    其余参数同 download_from_apple_url
+    """
+    if pool_size is None:
+        pool_size = max(10, jobs * segments)
+    session = create_session(pool_size=pool_size, retries=retries)
+    lookup_cache = LookupCache(cache_dir, refresh=refresh) if use_cache else None
+    feed_cache = FeedCache(cache_dir) if use_cache else None
+    
+    print(f"🎙️  Apple Podcast 批量下载 ({len(urls)} 个链接)")
+    print(f"=" * 50)
+    
+    # 1. 按播客分组
+    groups = {}
+    for url in urls:
+        podcast_id, episode_id, country_code = extract_podcast_info(url)
+        if not podcast_id:
+            print(f"⚠️  无法解析 Podcast ID,跳过: {url}")
+            continue
+        group = groups.setdefault((podcast_id, country_code), {'episode_ids': [], 'whole': False})
+        if episode_id:
+            group['episode_ids'].append(episode_id)
+        else:
+            group['whole'] = True
+    
+    if not groups:
+        print("❌ 没有可下载的链接")
+        return False
+    
+    # 2. 每个地区用多 ID lookup 批量解析单集链接
+    found = {}
+    by_country = {}
+    for (podcast_id, country_code), group in groups.items():
+        by_country.setdefault(country_code, []).extend(group['episode_ids'])
+    for country_code, episode_ids in by_country.items():
+        if episode_ids:
+            requests_needed = -(-len(set(episode_ids)) // BATCH_LOOKUP_SIZE)
+            print(f"📡 批量查询 {len(set(episode_ids))} 个单集 ({country_code.upper()},"
+                  f" 最多 {requests_needed} 次请求)")
+            found[country_code] = fetch_episodes_by_ids(episode_ids, country_code, session=session,
+                                                        cache=lookup_cache)
+    
+    # 3. 生成所有下载任务
+    catalog = None if plan_only else Catalog(output_dir, catalog_path)
+    manifests = {}
+    tasks = []
+    for (podcast_id, country_code), group in groups.items():
+        episodes = EpisodeIndex()
+        podcast_info = {}
+        source = 'batch_lookup'
+        missing = []
+        for episode_id in dict.fromkeys(group['episode_ids']):
+            episode = found.get(country_code, {}).get(episode_id)
+            if episode:
+                episodes.add(episode)
+            else:
+                missing.append(episode_id)
+        
+        if missing:
+            # 批量查询没有返回的单集,从 API 列表中查找 (每个播客只请求一次)
+            podcast_info, listed = fetch_episodes_via_api(podcast_id, country_code, session=session,
+                                                          cache=lookup_cache)
+            index = EpisodeIndex(listed)
+            for episode_id in missing:
+                episode = index.get_track(episode_id)
+                if episode:
+                    episodes.add(episode)
+                else:
+                    print(f"⚠️  未找到单集 {episode_id} (Podcast {podcast_id})")
+            podcast_info = podcast_info or {}
         
-        print(f"\n[{idx}/{len(episodes_to_download)}] {title}")
-        print(f"   📅 {release_date} | ⏱️  {duration_min} 分钟")
+        latency_ms = None
+        if group['whole']:
+            resolution = resolve_episodes(podcast_id, None, country_code, download_count,
+                                          session=session, lookup_cache=lookup_cache,
+                                          feed_cache=feed_cache)
+            podcast_info = resolution['podcast_info'] or podcast_info
+            source, latency_ms = resolution['source'], resolution['latency_ms']
+            latest = resolution['episodes']
+            for episode in latest[:download_count] if download_count else latest:
+                episodes.add(episode)
         
-        if not audio_url:
-            print("   ⚠️  未找到音频链接,跳过")
+        if not len(episodes):
+            print(f"❌ Podcast {podcast_id}: 无法获取任何节目信息")
             continue
         
-        # 确定文件扩展名
-        parsed_url = urlparse(audio_url)
-        ext = Path(parsed_url.path).suffix or '.m4a'
+        selected = sorted(episodes.episodes, key=_release_timestamp, reverse=True)
+        first = selected[0]
+        podcast_name = (podcast_info.get('collectionName') or first.get('collectionName')
+                        or 'Unknown Podcast')
+        podcast_folder = sanitize_filename(podcast_name)
+        output_path = Path(output_dir) / podcast_folder
+        if not plan_only:
+            output_path.mkdir(parents=True, exist_ok=True)
         
-        # 生成文件名
-        filename = f"{idx:03d} - {sanitize_filename(title)}{ext}"
-        file_path = output_path / filename
+        metadata = {
+            'podcast_name': podcast_name,
+            'artist': podcast_info.get('artistName') or first.get('artistName', ''),
+            'country': country_code,
+            'total_episodes': len(selected),
+            'download_date': datetime.now().isoformat(),
+            'source': source,
+            'resolve_ms': latency_ms,
+            'feed_url': podcast_info.get('feedUrl') or first.get('feedUrl')
+        }
+        if not plan_only:
+            catalog.record_podcast(podcast_folder, metadata)
+            if sidecars:
+                save_podcast_metadata(output_path, metadata)
         
-        # 下载
-        if download_audio(audio_url, file_path, title):
-            success_count += 1
-            print(f"   ✅ 已保存: {filename}")
-            
-            # 保存单集元数据
-            episode_meta = {
-                'title': title,
-                'release_date': release_date,
-                'duration_minutes': duration_min,
-                'description': episode.get('description', ''),
-                'audio_file': filename,
-                'download_url': audio_url
-            }
-            with open(file_path.with_suffix('.json'), 'w', encoding='utf-8') as f:
-                json.dump(episode_meta, f, indent=2, ensure_ascii=False)
+        if sync:
+            manifest = manifests[podcast_folder] = DownloadManifest(output_path)
+            planned = manifest.plan(selected)
+            if not plan_only:
+                manifest.save()
+            group_tasks = [build_episode_task(number, episode, output_path)
+                           for number, episode, on_disk in planned if not on_disk]
+        else:
+            group_tasks = [build_episode_task(idx, episode, output_path)
+                           for idx, episode in enumerate(selected, 1)]
+        for task in group_tasks:
+            task['podcast_folder'] = podcast_folder
+        print(f"📻 {podcast_name}: {len(group_tasks)} 集待下载")
+        tasks.extend(group_tasks)
+    
+    for task in tasks:
+        if not task['audio_url']:
+            print(f"   ⚠️  {task['title']}: 未找到音频链接,跳过")
+    runnable = [task for task in tasks if task['audio_url']]
+    
+    # 4. 共用一个调度器下载全部单集
+    store = AudioStore(store_dir) if store_dir else None
+    
+    if plan_only or space_check:
+        runnable = preflight(runnable, output_dir, session, jobs, store, limit_rate, min_free,
+                             plan_only, if_no_space)
+        if runnable is None:
+            return plan_only
+    
+    bandwidth = None
+    if limit_rate or per_host_rate or rate_control:
+        bandwidth = BandwidthLimiter(limit_rate, per_host_rate, rate_control)
+        print(f"🚦 限速: {format_rate(bandwidth.rate)} (每主机 {format_rate(bandwidth.per_host_rate)})")
+    
+    def on_success(task):
+        catalog.record_episode(task['podcast_folder'], task)
+        if sidecars:
+            save_episode_metadata(task)
+        if task['podcast_folder'] in manifests:
+            manifests[task['podcast_folder']].mark_downloaded(task)
+    
+    print(f"\n⚡ 开始下载 {len(runnable)} 集: {jobs} 个任务 (每个主机最多 {per_host} 个连接)")
+    print("=" * 50)
+    progress = create_progress_reporter(progress_mode, len(runnable), concurrent=True,
+                                        stream=progress_stream)
+    success_count = download_tasks_concurrently(runnable, jobs, per_host, segments, session,
+                                                on_success, bandwidth, progress, fsync_policy,
+                                                store)
     
-    # 7. 完成
     print("\n" + "=" * 50)
-    print(f"✨ 下载完成!")
-    print(f"📂 输出目录: {output_path}")
-    print(f"✅ 成功: {success_count}/{len(episodes_to_download)} 集")
+    print(f"✨ 批量下载完成!")
+    print(f"📂 输出目录: {output_dir}")
+    print(f"✅ 成功: {success_count}/{len(tasks)} 集")
+    print(f"🗂️  下载目录: {catalog.path}")
+    if bandwidth is not None:
+        bandwidth.close()
+        print(f"📶 实际吞吐: {format_rate(bandwidth.throughput())}")
+    
+    if lookup_cache:
+        lookup_cache.wait()
+    
+    return success_count == len(runnable)
+
+
+def parse_interval(value):
+    """解析时间间隔: 纯数字为秒,支持 s/m/h/d 后缀 (如 15m、2h)"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', str(value).lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"无效的时间间隔: {value}")
+    unit = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+    return float(match.group(1)) * unit
+
+
+def load_subscriptions(path):
+    """
+    读取订阅列表: OPML (outline 的 xmlUrl 属性) 或每行一个链接的纯文本 (# 开头为注释)
+    链接可以是 Apple Podcast 链接或 RSS Feed 地址
+    返回: [{'url', 'title'}],按出现顺序去重
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    
+    subscriptions = []
+    if content.lstrip().startswith(b'<'):
+        root = ET.fromstring(content)
+        for outline in root.iter('outline'):
+            url = outline.get('xmlUrl') or outline.get('url')
+            if url:
+                subscriptions.append({'url': url.strip(),
+                                      'title': outline.get('title') or outline.get('text') or ''})
+    else:
+        for line in content.decode('utf-8').splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                subscriptions.append({'url': line, 'title': ''})
+    
+    seen = set()
+    unique = []
+    for sub in subscriptions:
+        if sub['url'] not in seen:
+            seen.add(sub['url'])
+            unique.append(sub)
+    return unique
+
+
+def estimate_cadence(episodes, sample=10):
+    """根据最近 sample 个发布间隔的中位数估计更新周期 (秒),数据不足时返回 None"""
+    stamps = sorted((ts for ts in map(_release_timestamp, episodes) if ts), reverse=True)[:sample + 1]
+    gaps = sorted(a - b for a, b in zip(stamps, stamps[1:]) if a > b)
+    if not gaps:
+        return None
+    return gaps[len(gaps) // 2]
+
+
+def next_check_delay(episodes, min_interval=WATCH_MIN_INTERVAL, max_interval=WATCH_MAX_INTERVAL,
+                     now=None):
+    """
+    下次检查前的等待时间: 预计下一集发布时间 (最新一集 + 更新周期) 到来前不必频繁检查;
+    已超过预计时间则按周期的 1/10 轮询。结果限制在 [min_interval, max_interval]
+    """
+    now = now or time.time()
+    cadence = estimate_cadence(episodes)
+    latest = max(map(_release_timestamp, episodes), default=0)
+    if not cadence or not latest:
+        delay = max_interval
+    elif latest + cadence > now:
+        delay = latest + cadence - now
+    else:
+        delay = cadence / 10
+    return min(max(delay, min_interval), max_interval)
+
+
+class WatchScheduler:
+    """
+    watch 模式的检查队列: 按下次检查时间排序的优先队列
+    每个订阅的状态 (下次检查时间、连续失败次数、Feed 地址) 保存到 state_path,重启后沿用
+    """
+
+    def __init__(self, subscriptions, state_path, min_interval=WATCH_MIN_INTERVAL,
+                 max_interval=WATCH_MAX_INTERVAL):
+        self.state_path = Path(state_path)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f).get('feeds', {})
+        except (OSError, ValueError):
+            saved = {}
+        
+        self.feeds = {}
+        self._heap = []
+        self._seq = 0
+        now = time.time()
+        for sub in subscriptions:
+            state = dict(saved.get(sub['url'], {}))
+            state.update(url=sub['url'], title=sub['title'] or state.get('title', ''))
+            state.setdefault('failures', 0)
+            self.feeds[sub['url']] = state
+            self.push(sub['url'], min(state.get('next_check', now), now + max_interval))
+
+    def push(self, url, due):
+        self.feeds[url]['next_check'] = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, url))
+
+    def pop_due(self, now=None):
+        """取出一个已到期的订阅,没有则返回 None"""
+        now = now or time.time()
+        if self._heap and self._heap[0][0] <= now:
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def succeeded(self, url, episodes):
+        state = self.feeds[url]
+        state['failures'] = 0
+        state['last_success'] = time.time()
+        delay = next_check_delay(episodes, self.min_interval, self.max_interval)
+        cadence = estimate_cadence(episodes)
+        state['cadence_hours'] = round(cadence / 3600, 1) if cadence else None
+        self.push(url, time.time() + delay)
+        return delay
+
+    def failed(self, url, error):
+        """连续失败时指数退避 (带随机抖动,避免大量订阅同时重试)"""
+        state = self.feeds[url]
+        state['failures'] += 1
+        state['last_error'] = str(error)
+        delay = min(self.min_interval * 2 ** (state['failures'] - 1), WATCH_MAX_BACKOFF)
+        delay *= random.uniform(1.0, 1.1)
+        self.push(url, time.time() + delay)
+        return delay
+
+    def save(self):
+        _atomic_write_json(self.state_path, {'version': 1, 'feeds': self.feeds})
+
+
+def check_feed(state, output_dir, count, session, lookup_cache=None, feed_cache=None,
+               catalog=None, sidecars=False):
+    """
+    检查单个订阅: 获取最新单集,按下载清单找出尚未下载的单集
+    Apple 链接先通过 iTunes 查询 Feed 地址 (结果记在 state['feed_url']),RSS 地址直接解析
+    catalog: 传入时更新播客信息 (见 Catalog);sidecars 为 True 时同时写出 podcast_info.json
+    返回: (episodes, tasks, manifest, folder);Feed 无法获取时抛出异常
+    """
+    feed_url = state.get('feed_url')
+    if not feed_url:
+        podcast_id, _, country_code = extract_podcast_info(state['url'])
+        if podcast_id:
+            feed_url = get_rss_feed_url(podcast_id, country_code, session=session, cache=lookup_cache)
+            if not feed_url:
+                raise RuntimeError("无法获取 RSS Feed 地址")
+        else:
+            feed_url = state['url']
+        state['feed_url'] = feed_url
+    
+    # 多取几集用于估计更新周期
+    podcast_info, episodes = parse_rss_feed(feed_url, session=session, cache=feed_cache,
+                                            limit=max(count, 11))
+    if not episodes:
+        raise RuntimeError("Feed 中没有可用的单集")
+    
+    podcast_name = podcast_info.get('collectionName') or state.get('title') or 'Unknown Podcast'
+    state['title'] = podcast_name
+    folder = sanitize_filename(podcast_name)
+    output_path = Path(output_dir) / folder
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    metadata = {
+        'podcast_name': podcast_name,
+        'artist': podcast_info.get('artistName', ''),
+        'country': None,
+        'total_episodes': len(episodes),
+        'download_date': datetime.now().isoformat(),
+        'source': 'rss',
+        'resolve_ms': None,
+        'feed_url': feed_url
+    }
+    if catalog is not None:
+        catalog.record_podcast(folder, metadata)
+    if sidecars:
+        save_podcast_metadata(output_path, metadata)
+    
+    manifest = DownloadManifest(output_path)
+    planned = manifest.plan(episodes[:count])
+    manifest.save()
+    tasks = [build_episode_task(number, episode, output_path)
+             for number, episode, on_disk in planned if not on_disk]
+    return episodes, [task for task in tasks if task['audio_url']], manifest, folder
+
+
+def watch_subscriptions(subscription_file, output_dir='.', count=3, workers=4, per_host=4,
+                        segments=1, retries=3, cache_dir=None, use_cache=True, state_path=None,
+                        min_interval=WATCH_MIN_INTERVAL, max_interval=WATCH_MAX_INTERVAL,
+                        once=False, limit_rate=None, per_host_rate=None, rate_control=None,
+                        progress_mode='human', progress_stream=None, fsync_policy=None,
+                        store_dir=None, catalog_path=None, sidecars=False):
+    """
+    常驻进程: 持续检查订阅列表中的所有播客并下载新单集
+    检查按优先队列调度 (见 WatchScheduler),Feed 检查和音频下载共用 workers 个工作线程,
+    下载优先于检查;同一订阅的下载全部结束后才安排下一次检查
+    count: 每个订阅只关注最新 N 集 (首次订阅时也只下载这些)
+    once: 每个订阅检查一次并等待下载完成后退出 (适合 cron)
+    catalog_path / sidecars: 同 download_from_apple_url
+    """
+    subscriptions = load_subscriptions(subscription_file)
+    if not subscriptions:
+        print("❌ 订阅列表为空")
+        return False
+    
+    cache_root = Path(cache_dir or DEFAULT_CACHE_DIR)
+    cache_root.mkdir(parents=True, exist_ok=True)
+    scheduler = WatchScheduler(subscriptions, state_path or cache_root / 'watch_state.json',
+                               min_interval, max_interval)
+    if once:
+        # 单次模式忽略调度时间,所有订阅立即检查
+        for url in scheduler.feeds:
+            scheduler.push(url, 0)
+    session = create_session(pool_size=max(10, workers * segments), retries=retries)
+    lookup_cache = LookupCache(cache_dir) if use_cache else None
+    feed_cache = FeedCache(cache_dir) if use_cache else None
+    limiter = HostLimiter(per_host)
+    store = AudioStore(store_dir) if store_dir else None
+    catalog = Catalog(output_dir, catalog_path)
+    bandwidth = None
+    if limit_rate or per_host_rate or rate_control:
+        bandwidth = BandwidthLimiter(limit_rate, per_host_rate, rate_control)
+    if progress_mode == 'jsonl':
+        progress = create_progress_reporter('jsonl', stream=progress_stream)
+    else:
+        progress = ProgressReporter(LogRenderer())
+    
+    print(f"👀 监控 {len(subscriptions)} 个订阅 ({workers} 个工作线程, 每个订阅最新 {count} 集)")
+    
+    stop = threading.Event()
+    previous_handlers = {}
     
+    def request_stop(signum, frame):
+        if not stop.is_set():
+            print("\n🛑 收到退出信号,等待进行中的任务结束...")
+        stop.set()
+    
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            previous_handlers[signum] = signal.signal(signum, request_stop)
+    
+    def run_download(task):
+        with limiter.slot(task['audio_url']):
+            return fetch_episode_audio(task, progress, store, segments=segments, session=session,
+                                       bandwidth=bandwidth, fsync_policy=fsync_policy)
+    
+    pending_downloads = deque()
+    running = {}
+    remaining = {}
+    checked = set()
+    downloaded = 0
+    
+    def finish_feed(url, episodes, error=None):
+        if error is not None:
+            delay = scheduler.failed(url, error)
+            print(f"⚠️  {scheduler.feeds[url]['title'] or url}: {error}"
+                  f" (第 {scheduler.feeds[url]['failures']} 次失败, {delay / 60:.0f} 分钟后重试)")
+        else:
+            delay = scheduler.succeeded(url, episodes)
+            when = f"{delay / 3600:.1f} 小时" if delay >= 3600 else f"{delay / 60:.0f} 分钟"
+            print(f"🗓️  {scheduler.feeds[url]['title']}: {when}后再次检查")
+        scheduler.save()
+    
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            if once and len(checked) == len(subscriptions) and not running and not pending_downloads:
+                break
+            if stop.is_set() and not running:
+                break
+            
+            # 先安排下载,空闲线程再用于检查到期的订阅
+            while not stop.is_set() and len(running) < workers:
+                if pending_downloads:
+                    url, task = pending_downloads.popleft()
+                    running[executor.submit(run_download, task)] = ('download', url, task)
+                    continue
+                url = scheduler.pop_due()
+                if url is None:
+                    break
+                if once and url in checked:
+                    continue
+                checked.add(url)
+                running[executor.submit(check_feed, scheduler.feeds[url], output_dir, count, session,
+                                        lookup_cache, feed_cache, catalog,
+                                        sidecars)] = ('check', url, None)
+            
+            timeout = 1.0
+            next_due = scheduler.next_due()
+            if not running and next_due and not once:
+                timeout = min(max(next_due - time.time(), 0.1), 60)
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                kind, url, task = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result, error = None, e
+                else:
+                    error = None
+                
+                if kind == 'check':
+                    if error is not None:
+                        finish_feed(url, None, error)
+                        continue
+                    episodes, tasks, manifest, folder = result
+                    if not tasks:
+                        finish_feed(url, episodes)
+                        continue
+                    print(f"🆕 {scheduler.feeds[url]['title']}: {len(tasks)} 集新节目")
+                    remaining[url] = [len(tasks), episodes, manifest, folder]
+                    pending_downloads.extend((url, task) for task in tasks)
+                else:
+                    entry = remaining[url]
+                    if result:
+                        catalog.record_episode(entry[3], task)
+                        if sidecars:
+                            save_episode_metadata(task)
+                        entry[2].mark_downloaded(task)
+                        downloaded += 1
+                    entry[0] -= 1
+                    if entry[0] == 0:
+                        del remaining[url]
+                        finish_feed(url, entry[1])
+            
+            if stop.is_set():
+                pending_downloads.clear()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        scheduler.save()
+        progress.close()
+        if bandwidth is not None:
+            bandwidth.close()
+        if lookup_cache:
+            lookup_cache.wait()
+    
+    print(f"✨ 监控结束: 本次下载 {downloaded} 集")
     return True
 
 
-def main():
+def add_transfer_arguments(parser):
+    """下载相关的公共参数 (单次下载与 watch 模式共用)"""
+    parser.add_argument('--per-host', type=int, default=4,
+                       help='并发模式下每个主机的最大连接数 (默认: 4)')
+    parser.add_argument('--segments', type=int, default=1,
+                       help='单个文件分段并发下载的段数,服务器需支持 Range (默认: 1)')
+    parser.add_argument('--limit-rate', type=parse_rate,
+                       help='全局带宽上限,如 500K、2M (默认: 不限)')
+    parser.add_argument('--per-host-rate', type=parse_rate,
+                       help='每个主机的带宽上限,如 1M (默认: 不限)')
+    parser.add_argument('--rate-control',
+                       help='限速控制文件,运行中修改 (如写入 "2M" 或 "2M 512K") 即时生效,SIGHUP 立即重新加载')
+    parser.add_argument('--fsync', type=parse_fsync_policy, default=None, metavar='POLICY',
+                       help='音频写入的 fsync 策略: none (默认)、end (完成时同步)、或如 64M (每 64 MB 同步一次)')
+    parser.add_argument('--store', metavar='DIR',
+                       help='内容寻址音频库目录: 音频按 SHA-256 只存一份,输出文件为硬链接 (默认: 不启用)')
+    parser.add_argument('--catalog', metavar='PATH',
+                       help='下载目录数据库 (默认: <输出目录>/catalog.sqlite3)')
+    parser.add_argument('--sidecars', action='store_true',
+                       help='同时写出旧版的 podcast_info.json 和每集 .json 元数据文件')
+    parser.add_argument('--progress', choices=['human', 'jsonl'], default='human',
+                       help='进度输出格式: human 为终端进度;jsonl 时向 stdout 逐行输出 JSON 事件,'
+                            '其余日志改写到 stderr (默认: human)')
+    parser.add_argument('--retries', type=int, default=3,
+                       help='网络请求失败时的重试次数 (默认: 3)')
+    parser.add_argument('--cache-dir',
+                       help=f'本地缓存目录 (默认: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='禁用本地缓存')
+
+
+def watch_main(argv):
+    """watch 子命令: 常驻监控订阅列表"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} watch",
+        description='持续监控订阅列表 (OPML 或每行一个链接),按各播客的更新周期检查并下载新单集',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  # 监控 OPML 中的所有播客,每个播客保留最新 3 集
+  %(prog)s subscriptions.opml -o ~/podcasts
+  
+  # 纯文本订阅列表,8 个工作线程,限速 5 MB/s
+  %(prog)s feeds.txt -o ~/podcasts -w 8 --limit-rate 5M
+  
+  # 每个订阅只检查一次 (适合 cron)
+  %(prog)s feeds.txt -o ~/podcasts --once
+        """
+    )
+    parser.add_argument('subscriptions', help='订阅列表: OPML 文件或每行一个链接的文本文件')
+    parser.add_argument('-o', '--output', default='.',
+                       help='输出目录 (默认: 当前目录)')
+    parser.add_argument('-n', '--count', type=int, default=3,
+                       help='每个订阅只关注最新 N 集 (默认: 3)')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                       help='Feed 检查与下载共用的工作线程数 (默认: 4)')
+    parser.add_argument('--min-interval', type=parse_interval, default=WATCH_MIN_INTERVAL,
+                       help='同一订阅两次检查的最短间隔,如 15m (默认: 15m)')
+    parser.add_argument('--max-interval', type=parse_interval, default=WATCH_MAX_INTERVAL,
+                       help='同一订阅两次检查的最长间隔,如 24h (默认: 24h)')
+    parser.add_argument('--state',
+                       help='调度状态文件 (默认: <cache-dir>/watch_state.json)')
+    parser.add_argument('--once', action='store_true',
+                       help='每个订阅检查一次,下载完成后退出')
+    add_transfer_arguments(parser)
+    
+    args = parser.parse_args(argv)
+    
+    event_stream = sys.stdout
+    log_target = sys.stderr if args.progress == 'jsonl' else sys.stdout
+    with redirect_stdout(log_target):
+        success = watch_subscriptions(
+            args.subscriptions,
+            output_dir=args.output,
+            count=max(1, args.count),
+            workers=max(1, args.workers),
+            per_host=args.per_host,
+            segments=max(1, args.segments),
+            retries=args.retries,
+            cache_dir=args.cache_dir,
+            use_cache=not args.no_cache,
+            state_path=args.state,
+            min_interval=args.min_interval,
+            max_interval=max(args.min_interval, args.max_interval),
+            once=args.once,
+            limit_rate=args.limit_rate,
+            per_host_rate=args.per_host_rate,
+            rate_control=args.rate_control,
+            progress_mode=args.progress,
+            progress_stream=event_stream,
+            fsync_policy=args.fsync,
+            store_dir=args.store,
+            catalog_path=args.catalog,
+            sidecars=args.sidecars
+        )
+    
+    return 0 if success else 1
+
+
+def catalog_main(argv):
+    """catalog 子命令: 查询下载目录,导入 / 导出旧版 JSON 元数据"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} catalog",
+        description='查询已下载的单集 (读取 <输出目录>/catalog.sqlite3)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  # 列出所有播客及已下载数量
+  %(prog)s -o ~/podcasts --podcasts
+  
+  # 某个播客 2025 年以来的单集
+  %(prog)s -o ~/podcasts --podcast 播客名 --since 2025-01-01
+  
+  # 从旧版 JSON 元数据建立目录 / 导出旧版 JSON
+  %(prog)s -o ~/podcasts --import-sidecars
+  %(prog)s -o ~/podcasts --export-sidecars
+        """
+    )
+    parser.add_argument('-o', '--output', default='.',
+                       help='下载输出目录 (默认: 当前目录)')
+    parser.add_argument('--catalog', metavar='PATH',
+                       help='下载目录数据库 (默认: <输出目录>/catalog.sqlite3)')
+    parser.add_argument('--podcast', help='只显示名称包含该文字的播客')
+    parser.add_argument('--since', help='发布日期不早于 YYYY-MM-DD')
+    parser.add_argument('--until', help='发布日期不晚于 YYYY-MM-DD')
+    parser.add_argument('--search', help='标题或简介包含的文字')
+    parser.add_argument('--limit', type=int, help='最多显示 N 条')
+    parser.add_argument('--podcasts', action='store_true', help='按播客汇总显示')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+    parser.add_argument('--import-sidecars', action='store_true',
+                       help='从旧版 podcast_info.json / 单集 .json 导入')
+    parser.add_argument('--export-sidecars', action='store_true',
+                       help='按旧版格式写出 podcast_info.json 和单集 .json')
+    args = parser.parse_args(argv)
+    
+    catalog = Catalog(args.output, args.catalog)
+    if args.import_sidecars:
+        print(f"📥 已导入 {catalog.import_sidecars()} 集")
+    if args.export_sidecars:
+        print(f"📤 已写出 {catalog.export_sidecars(args.podcast)} 集的元数据文件")
+    if args.import_sidecars or args.export_sidecars:
+        return 0
+    
+    if args.podcasts:
+        rows = [row for row in catalog.podcasts()
+                if not args.podcast or args.podcast in row['name'] or args.podcast in row['folder']]
+        if args.json:
+            print(json.dumps(rows, indent=2, ensure_ascii=False))
+            return 0
+        for row in rows:
+            print(f"📻 {row['name']}  ({row['downloaded']} 集, {row['bytes'] / 1024 / 1024:.1f} MB)"
+                  f"  {row['folder']}/")
+        return 0
+    
+    rows = catalog.query(args.podcast, args.since, args.until, args.search, args.limit)
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+        return 0
+    total_bytes = 0
+    for row in rows:
+        total_bytes += row['size'] or 0
+        print(f"{row['release_date'] or '----------'}  {row['podcast_name']}  "
+              f"{row['title']}  ({row['duration_minutes'] or 0} 分钟)  {row['file_path']}")
+    print(f"\n共 {len(rows)} 集, {total_bytes / 1024 / 1024:.1f} MB")
+    return 0
+
+
+VERIFY_PROBLEMS = ('missing', 'short', 'corrupt')
+
+
+def _verify_file(path, expected_size, expected_digest):
+    """
+    校验单个文件 (在子进程中运行)
+    返回 (状态, 实际大小, 实际摘要);状态为 ok / missing / short / corrupt / no_digest,
+    比记录短的文件不计算摘要
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 'missing', None, None
+    if expected_size is not None and size < expected_size:
+        return 'short', size, None
+    hasher = hashlib.sha256()
+    _hash_file(path, hasher)
+    digest = hasher.hexdigest()
+    if not expected_digest:
+        return 'no_digest', size, digest
+    if size != expected_size or digest != expected_digest:
+        return 'corrupt', size, digest
+    return 'ok', size, digest
+
+
+def _prepare_resume(session, row, file_path):
+    """
+    截短的文件: 远程文件大小仍与记录一致且有校验信息时,把它改回 .part 并写入续传信息,
+    让 download_audio 只补齐缺少的部分;否则删除后整个重新下载
+    """
+    remote = _probe_remote(session, row['audio_url'], {})
+    part_path, state_path = _part_paths(file_path)
+    if remote and remote['size'] == row['size'] and (remote['etag'] or remote['last_modified']):
+        os.replace(file_path, part_path)
+        _atomic_write_json(state_path, {
+            'url': row['audio_url'],
+            'etag': remote['etag'],
+            'last_modified': remote['last_modified'],
+            'total_size': remote['size']
+        })
+    else:
+        file_path.unlink()
+
+
+def refetch_episode(catalog, row, status, progress, session=None, **kwargs):
+    """
+    重新下载校验失败的单集,摘要与记录不符时再从头下载一次,
+    成功后把新的大小和摘要写回下载目录;返回是否成功
+    """
+    file_path = catalog.root / row['file_path']
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    if status == 'short':
+        _prepare_resume(get_session(session), row, file_path)
+    elif status == 'corrupt':
+        file_path.unlink()
+    
+    for attempt in range(2):
+        digest = StreamDigest()
+        if not download_audio(row['audio_url'], file_path, row['title'], progress=progress,
+                              session=session, hasher=digest, **kwargs):
+            return False
+        if not row['digest'] or digest.hexdigest() == row['digest'] or attempt:
+            break
+        # 续传拼出的文件与记录不符 (远程文件已变化),丢弃后完整下载
+        file_path.unlink()
+    catalog.update_integrity(row['folder'], row['identity'], digest.size, digest.hexdigest())
+    return True
+
+
+def verify_library(catalog, podcast=None, jobs=None, check_only=False, workers=3, session=None,
+                   progress=None, **kwargs):
+    """
+    校验下载目录中记录的所有单集: 多进程并行计算摘要,与记录的大小和摘要比对
+    没有摘要记录的单集把本次结果记为基准;除非 check_only,只重新下载缺失、截短或损坏的文件
+    返回 {状态: 数量},重新下载失败的计入 'failed'
+    """
+    rows = catalog.query(podcast=podcast)
+    counts = {}
+    problems = []
+    print(f"🔍 校验 {len(rows)} 个文件 ({jobs or os.cpu_count()} 个进程)...")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(_verify_file, str(catalog.root / row['file_path']),
+                            row['size'], row['digest']): row
+            for row in rows
+        }
+        for future in as_completed(futures):
+            row = futures[future]
+            status, size, digest = future.result()
+            counts[status] = counts.get(status, 0) + 1
+            if status == 'no_digest':
+                catalog.update_integrity(row['folder'], row['identity'], size, digest)
+            elif status in VERIFY_PROBLEMS:
+                print(f"  ❌ {status}: {row['file_path']}")
+                problems.append((row, status))
+    
+    if check_only or not problems:
+        return counts
+    
+    refetchable = [(row, status) for row, status in problems if row['audio_url']]
+    if len(refetchable) < len(problems):
+        counts['failed'] = len(problems) - len(refetchable)
+        print(f"⚠️  {counts['failed']} 个文件没有记录下载链接,无法重新下载")
+    print(f"\n📥 重新下载 {len(refetchable)} 个文件...")
+    if progress is None:
+        progress = create_progress_reporter(total_episodes=len(refetchable), concurrent=workers > 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(refetch_episode, catalog, row, status, progress,
+                                   session=session, **kwargs)
+                   for row, status in refetchable]
+        for future in as_completed(futures):
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"  ❌ 重新下载出错: {e}")
+                ok = False
+            if ok:
+                counts['refetched'] = counts.get('refetched', 0) + 1
+            else:
+                counts['failed'] = counts.get('failed', 0) + 1
+    return counts
+
+
+def verify_main(argv):
+    """verify 子命令: 校验本地音频的完整性,重新下载有问题的文件"""
+    parser = argparse.ArgumentParser(
+        prog=f"{Path(sys.argv[0]).name} verify",
+        description='按下载目录记录的大小和 SHA-256 校验本地音频,只重新下载缺失、截短或损坏的文件',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  # 校验整个下载目录并修复
+  %(prog)s -o ~/podcasts
+  
+  # 只校验某个播客,不重新下载
+  %(prog)s -o ~/podcasts --podcast 播客名 --check-only
+        """
+    )
+    parser.add_argument('-o', '--output', default='.',
+                       help='下载输出目录 (默认: 当前目录)')
+    parser.add_argument('--catalog', metavar='PATH',
+                       help='下载目录数据库 (默认: <输出目录>/catalog.sqlite3)')
+    parser.add_argument('--podcast', help='只校验名称包含该文字的播客')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                       help='计算摘要的进程数 (默认: CPU 核数)')
+    parser.add_argument('-w', '--workers', type=int, default=3,
+                       help='重新下载的并发数 (默认: 3)')
+    parser.add_argument('--check-only', action='store_true', help='只校验,不重新下载')
+    parser.add_argument('--limit-rate', type=parse_rate, default=None, metavar='RATE',
+                       help='重新下载的总带宽上限,如 500K、2M')
+    args = parser.parse_args(argv)
+    
+    catalog_path = Path(args.catalog) if args.catalog else Path(args.output) / Catalog.FILENAME
+    if not catalog_path.exists():
+        print(f"❌ 找不到下载目录: {catalog_path}")
+        return 1
+    catalog = Catalog(args.output, args.catalog)
+    bandwidth = BandwidthLimiter(args.limit_rate) if args.limit_rate else None
+    session = create_session(pool_size=max(10, args.workers))
+    try:
+        counts = verify_library(catalog, podcast=args.podcast, jobs=args.jobs,
+                                check_only=args.check_only, workers=args.workers,
+                                session=session, bandwidth=bandwidth)
+    finally:
+        if bandwidth:
+            bandwidth.close()
+    
+    labels = [('ok', '✅ 完好'), ('no_digest', '📝 新记录摘要'), ('missing', '❓ 缺失'),
+              ('short', '✂️  截短'), ('corrupt', '💥 损坏'), ('refetched', '📥 已重新下载'),
+              ('failed', '❌ 修复失败')]
+    print()
+    for key, label in labels:
+        if counts.get(key):
+            print(f"{label}: {counts[key]}")
+    unresolved = counts.get('failed', 0)
+    if args.check_only:
+        unresolved += sum(counts.get(key, 0) for key in VERIFY_PROBLEMS)
+    return 1 if unresolved else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'watch':
+        return watch_main(argv[1:])
+    if argv and argv[0] == 'catalog':
+        return catalog_main(argv[1:])
+    if argv and argv[0] == 'verify':
+        return verify_main(argv[1:])
+    
     parser = argparse.ArgumentParser(
         description='Apple Podcast 下载器 (API 增强版)',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -341,28 +3547,108 @@ def main():
   # 下载最新 5 集
   %(prog)s "https://podcasts.apple.com/cn/podcast/id123456" -n 5
   
-  # 下载所有可用节目 (最多 200 集)
+  # 下载所有可用节目 (API 超过 200 集时从 RSS 补全)
   %(prog)s "https://podcasts.apple.com/us/podcast/id123456"
   
   # 指定输出目录
   %(prog)s "https://podcasts.apple.com/cn/podcast/id123456" -n 10 -o /path/to/output
+  
+  # 8 个任务并发下载 (每个主机最多 4 个连接)
+  %(prog)s "https://podcasts.apple.com/cn/podcast/id123456" -j 8 --per-host 4
+  
+  # 每日增量同步 (只下载新单集)
+  %(prog)s "https://podcasts.apple.com/cn/podcast/id123456" -n 20 --sync
+  
+  # 共享服务器上限速 2 MB/s,可通过控制文件随时调整
+  %(prog)s "https://podcasts.apple.com/cn/podcast/id123456" -j 4 --limit-rate 2M --rate-control /tmp/podcast.rate
+  
+  # 使用内容寻址库,节目改名或编号变化后不会重复下载
+  %(prog)s "https://podcasts.apple.com/cn/podcast/id123456" --store ~/podcast-store -o ~/podcasts
+  
+  # 单个长节目分 4 段并发下载
+  %(prog)s "https://podcasts.apple.com/cn/podcast/id123456?i=789012" --segments 4
+  
+  # 批量下载链接列表 (按播客分组批量查询,共用一个调度器)
+  %(prog)s --batch links.txt -j 8 -o /path/to/output
+  
+  # 大规模补档前先查看计划 (总大小、可用空间、预计耗时)
+  %(prog)s "https://podcasts.apple.com/cn/podcast/id123456" -j 8 --plan
+  
+  # 常驻监控订阅列表 (详见 %(prog)s watch --help)
+  %(prog)s watch subscriptions.opml -o ~/podcasts
+  
+  # 查询已下载的单集 (详见 %(prog)s catalog --help)
+  %(prog)s catalog -o ~/podcasts --since 2025-01-01
+  
+  # 校验本地文件,重新下载截短或损坏的 (详见 %(prog)s verify --help)
+  %(prog)s verify -o ~/podcasts
         """
     )
     
-    parser.add_argument('url', help='Apple Podcast 链接')
+    parser.add_argument('url', nargs='?', help='Apple Podcast 链接')
+    parser.add_argument('--batch', metavar='FILE',
+                       help="批量模式: 从文件 (或 '-' 表示标准输入) 读取链接,每行一个,共用一个调度器下载")
     parser.add_argument('-n', '--count', type=int,
                        help='下载最新 N 集 (默认下载所有可用节目)')
     parser.add_argument('-o', '--output', default='.',
                        help='输出目录 (默认: 当前目录)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                       help='并发下载任务数 (默认: 1,顺序下载)')
+    parser.add_argument('--pool-size', type=int,
+                       help='HTTP 连接池大小 (默认: max(10, jobs × segments))')
+    parser.add_argument('--refresh', action='store_true',
+                       help='忽略已缓存的 iTunes 查询结果,强制重新请求')
+    parser.add_argument('--sync', action='store_true',
+                       help='增量同步: 只下载尚未下载的单集,文件编号保持稳定')
+    parser.add_argument('--plan', action='store_true',
+                       help='只输出下载计划: 并发获取每个音频的大小,与可用空间比较并估计耗时,不下载')
+    parser.add_argument('--min-free', type=parse_rate, default=DEFAULT_MIN_FREE, metavar='SIZE',
+                       help='下载后至少保留的磁盘空间,如 2G (默认: 512M)')
+    parser.add_argument('--if-no-space', choices=['trim', 'refuse'], default='trim',
+                       help='空间不足时: trim 只下载放得下的最新单集,refuse 不下载 (默认: trim)')
+    parser.add_argument('--space-check', action='store_true',
+                       help='下载前逐个获取文件大小并检查磁盘空间 (每集多一次请求)')
+    add_transfer_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if not args.url and not args.batch:
+        parser.error('需要提供 Apple Podcast 链接或 --batch 文件')
     
-    success = download_from_apple_url(
-        args.url,
+    options = dict(
         output_dir=args.output,
-        download_count=args.count
+        download_count=args.count,
+        jobs=max(1, args.jobs),
+        per_host=args.per_host,
+        segments=max(1, args.segments),
+        pool_size=args.pool_size,
+        retries=args.retries,
+        cache_dir=args.cache_dir,
+        use_cache=not args.no_cache,
+        refresh=args.refresh,
+        sync=args.sync,
+        limit_rate=args.limit_rate,
+        per_host_rate=args.per_host_rate,
+        rate_control=args.rate_control,
+        progress_mode=args.progress,
+        progress_stream=sys.stdout,
+        fsync_policy=args.fsync,
+        store_dir=args.store,
+        catalog_path=args.catalog,
+        sidecars=args.sidecars,
+        plan_only=args.plan,
+        space_check=args.space_check,
+        min_free=args.min_free,
+        if_no_space=args.if_no_space
     )
     
+    log_target = sys.stderr if args.progress == 'jsonl' else sys.stdout
+    with redirect_stdout(log_target):
+        if args.batch:
+            urls = read_batch_urls(args.batch) + ([args.url] if args.url else [])
+            success = download_batch(urls, **options)
+        else:
+            success = download_from_apple_url(args.url, **options)
+    
     return 0 if success else 1
 
 
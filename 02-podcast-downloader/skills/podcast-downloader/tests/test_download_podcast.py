@@ -0,0 +1,76 @@
+"""
+download_podcast.py 的回归测试 (本地 HTTP 服务,不访问网络)
+运行: python -m pytest skills/podcast-downloader/tests
+"""
+
+import functools
+import http.server
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import download_podcast  # noqa: E402
+
+
+def serve_directory(directory):
+    """在随机端口上提供 directory 中的文件,返回 (server, base_url)"""
+    handler = functools.partial(_QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class SyncPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        media = self.root / 'media'
+        media.mkdir()
+        for name in ('a', 'b', 'c'):
+            (media / f'{name}.mp3').write_bytes(b'\0' * 1024)
+        self.server, base_url = serve_directory(media)
+        self.episodes = [
+            {'trackName': f'Ep {name}', 'episodeGuid': f'guid-{name}',
+             'episodeUrl': f'{base_url}/{name}.mp3'}
+            for name in ('c', 'b', 'a')
+        ]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def run_plan(self, output_dir):
+        resolution = {'podcast_info': {'collectionName': 'Fake Show'}, 'episodes': self.episodes,
+                      'source': 'rss', 'latency_ms': 0}
+        with mock.patch.object(download_podcast, 'resolve_episodes', return_value=resolution):
+            return download_podcast.download_from_apple_url(
+                'https://podcasts.apple.com/us/podcast/id123', output_dir=str(output_dir),
+                use_cache=False, sync=True, plan_only=True)
+
+    def test_sync_plan_on_new_output_dir(self):
+        output_dir = self.root / 'out'
+        self.assertTrue(self.run_plan(output_dir))
+        # 计划模式不创建目录,也不写清单
+        self.assertFalse((output_dir / 'Fake Show').exists())
+
+    def test_manifest_plan_without_podcast_dir(self):
+        manifest = download_podcast.DownloadManifest(self.root / 'missing')
+        planned = manifest.plan(self.episodes)
+        self.assertEqual([number for number, _, _ in planned], [3, 2, 1])
+        self.assertFalse(any(on_disk for _, _, on_disk in planned))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,13 +8,61 @@ import sys
 import argparse
 import subprocess
 import json
+import os
+import random
 import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout
 from pathlib import Path
 from datetime import datetime
 
 
-def check_ytdlp_installed():
-    """检查 yt-dlp 是否安装"""
+# 播放列表并行下载时每个网站的并发上限，未列出的网站使用 default
+DEFAULT_SITE_LIMITS = {'youtube': 3, 'bilibili': 2, 'default': 4}
+
+# 被网站限流的错误特征 (小写匹配)
+THROTTLE_PATTERNS = ('429', 'too many requests', 'rate limit', 'rate-limit', 'throttl', 'not a bot')
+THROTTLE_RETRIES = 5
+THROTTLE_BACKOFF = 30       # 首次退避秒数，之后每次翻倍
+THROTTLE_MAX_BACKOFF = 600
+
+# 下载索引默认文件名 (位于输出目录下，以 . 开头不会出现在文件列表中)
+ARCHIVE_FILENAME = '.download_archive.sqlite3'
+
+# 本次运行的文件清单默认文件名 (位于输出目录下，每次运行覆盖)
+MANIFEST_FILENAME = '.download_manifest.json'
+
+# 子进程方式的进度模板：yt-dlp 每次进度回调输出一行 "标记\t进度JSON\t视频JSON"，再由 ProgressEmitter 解析
+PROGRESS_MARKER = '@progress'
+POSTPROCESS_MARKER = '@postprocess'
+PROGRESS_INFO_FIELDS = '%(info.{id,title,playlist_index})j'
+PROGRESS_TEMPLATES = [
+    '--progress-template',
+    f'download:{PROGRESS_MARKER}\t%(progress.{{status,downloaded_bytes,total_bytes,total_bytes_estimate,'
+    f'speed,eta,elapsed,fragment_index,fragment_count,filename}})j\t{PROGRESS_INFO_FIELDS}',
+    '--progress-template',
+    f'postprocess:{POSTPROCESS_MARKER}\t%(progress.{{status,postprocessor}})j\t{PROGRESS_INFO_FIELDS}',
+]
+
+
+def load_ytdlp():
+    """导入 yt_dlp Python 包，未安装时返回 None（退回子进程方式）"""
+    try:
+        import yt_dlp
+    except ImportError:
+        return None
+    return yt_dlp
+
+
+def check_ytdlp_installed(yt_dlp=None):
+    """检查 yt-dlp 是否安装（传入已导入的 yt_dlp 包时直接读取版本，不启动子进程）"""
+    if yt_dlp is not None:
+        print(f"✅ yt-dlp 版本: {yt_dlp.version.__version__} (进程内)")
+        return True
     try:
         result = subprocess.run(
             ['yt-dlp', '--version'],
@@ -68,11 +116,24 @@ def get_video_info(url, cookies_file=None):
     return None
 
 
-def build_ytdlp_command(url, output_dir, format_quality='best', audio_only=False,
-                        subtitles=False, sub_lang='en,zh-Hans', cookies_file=None,
-                        is_playlist=False, playlist_count=None, download_thumbnail=False):
-    """构建 yt-dlp 命令"""
-    cmd = ['yt-dlp']
+def print_video_info(info):
+    """显示视频信息"""
+    if 'title' in info:
+        print(f"📺 标题: {info.get('title', 'Unknown')}")
+    if 'uploader' in info:
+        print(f"👤 作者: {info.get('uploader', 'Unknown')}")
+    if 'duration' in info and info['duration']:
+        duration = int(info['duration'])
+        print(f"⏱️  时长: {duration // 60}:{duration % 60:02d}")
+    if 'view_count' in info and info['view_count']:
+        print(f"👁️  观看: {info['view_count']:,}")
+
+
+def build_ytdlp_args(output_dir, format_quality='best', audio_only=False,
+                     subtitles=False, sub_lang='en,zh-Hans', cookies_file=None,
+                     is_playlist=False, playlist_count=None, download_thumbnail=False):
+    """构建 yt-dlp 命令行选项（不含程序名和 URL），子进程和进程内两种方式共用"""
+    cmd = []
 
     # 输出模板
     if is_playlist:
@@ -128,28 +189,757 @@ def build_ytdlp_command(url, output_dir, format_quality='best', audio_only=False
         '--no-overwrites',          # 不覆盖已存在的文件
         '--continue',               # 断点续传
         '--embed-metadata',         # 嵌入元数据
-        '--progress',               # 显示进度
-        '--console-title',          # 在终端标题显示进度
         '--restrict-filenames',     # 限制文件名字符
     ])
 
-    cmd.append(url)
-
     return cmd
 
 
+def build_ytdlp_command(url, output_dir, **kwargs):
+    """构建 yt-dlp 命令，参数同 build_ytdlp_args"""
+    return ['yt-dlp'] + build_ytdlp_args(output_dir, **kwargs) + [url]
+
+
+def build_ydl_options(yt_dlp, args):
+    """
+    把命令行选项交给 yt_dlp 自己的解析器转换为 YoutubeDL 参数，
+    保证进程内下载与子进程方式的行为完全一致
+    """
+    _, _, _, ydl_opts = yt_dlp.parse_options(args)
+    return ydl_opts
+
+
+def archive_id(info):
+    """yt-dlp 的下载索引键: '提取器名(小写) 视频ID'，缺少任一项时返回 None"""
+    extractor = info.get('extractor_key') or info.get('ie_key')
+    video_id = info.get('id')
+    if not extractor or not video_id:
+        return None
+    return f"{extractor.lower()} {video_id}"
+
+
+def archive_id_from_url(yt_dlp, url):
+    """
+    不请求网络，仅从 URL 推出下载索引键 (提取器能从 URL 识别视频 ID 时)
+    URL 中的 ID 与解析后的视频 ID 不一致的站点 (如 Bilibili) 永远不会命中，
+    这类视频照常解析页面，由 yt-dlp 在下载前按解析出的 ID 检查索引
+    """
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.suitable(url):
+            temp_id = ie.get_temp_id(url)
+            return f"{ie.ie_key().lower()} {temp_id}" if temp_id else None
+    return None
+
+
+class DownloadArchive:
+    """
+    下载索引 (SQLite)：提取器 + 视频 ID → 文件路径、大小、下载时间
+    同时实现 yt-dlp download_archive 所需的 `in` / add 接口，可直接作为 YoutubeDL 参数传入，
+    播放列表条目在解析页面之前就能按 ID 跳过
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    extractor TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    file_path TEXT,
+                    size INTEGER,
+                    downloaded_at TEXT NOT NULL,
+                    PRIMARY KEY (extractor, video_id)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def __contains__(self, key):
+        """
+        已记录且文件仍完整时才算命中；记录的文件已删除或大小不符时删掉该行，让 yt-dlp 重新下载
+        (只有 add 写入、没有文件路径的行无从核对，按已下载处理)
+        key 为 None 时 (yt-dlp 无法为缺少 ID 的条目生成索引键) 视为未下载
+        """
+        if not key:
+            return False
+        extractor, _, video_id = key.partition(' ')
+        with self._connect() as conn:
+            row = conn.execute("SELECT file_path, size FROM downloads WHERE extractor = ? AND video_id = ?",
+                               (extractor, video_id)).fetchone()
+            if row is None:
+                return False
+            file_path, size = row
+            if file_path is None:
+                return True
+            path = Path(file_path)
+            if path.is_file() and (size is None or path.stat().st_size == size):
+                return True
+            conn.execute("DELETE FROM downloads WHERE extractor = ? AND video_id = ?",
+                         (extractor, video_id))
+        return False
+
+    def add(self, key):
+        """yt-dlp 下载完成后调用；文件路径由 postprocessor_hook 先行记录，这里只补上缺失的行"""
+        extractor, _, video_id = key.partition(' ')
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO downloads (extractor, video_id, downloaded_at) "
+                         "VALUES (?, ?, ?)", (extractor, video_id, datetime.now().isoformat()))
+
+    def record(self, info):
+        """记录一个已下载的视频 (info 为 yt-dlp 处理后的视频信息，含最终 filepath)"""
+        key = archive_id(info)
+        if not key:
+            return
+        extractor, _, video_id = key.partition(' ')
+        file_path = info.get('filepath')
+        size = None
+        if file_path and Path(file_path).exists():
+            file_path = str(Path(file_path).resolve())
+            size = Path(file_path).stat().st_size
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO downloads (extractor, video_id, file_path, size, downloaded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (extractor, video_id, file_path, size, datetime.now().isoformat()))
+
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor_hooks 回调：文件移动到最终位置后记录"""
+        if d['status'] == 'finished' and d['postprocessor'] == 'MoveFiles':
+            self.record(d['info_dict'])
+
+    def ydl_options(self, ydl_opts):
+        """返回接入本索引的 YoutubeDL 参数"""
+        return {
+            **ydl_opts,
+            'download_archive': self,
+            'postprocessor_hooks': list(ydl_opts.get('postprocessor_hooks') or []) + [self.postprocessor_hook],
+        }
+
+
+class ProgressEmitter:
+    """
+    进度事件源：把 yt-dlp 的 progress_hooks / postprocessor_hooks 回调转换为结构化事件，
+    节流后交给 callback(event)
+    事件 (dict，event 字段为类型)：start / progress / downloaded / exists / postprocess / error，
+    均带 id、title、playlist_index、file 和 ts
+    interval: 同一文件两次 progress 事件的最小间隔 (秒)；percent_step: 进度每增加该百分比也会发出事件
+    """
+
+    def __init__(self, callback, interval=0.5, percent_step=10.0):
+        self.callback = callback
+        self.interval = interval
+        self.percent_step = percent_step
+        self._lock = threading.Lock()
+        self._files = {}
+        self._phases = {}
+
+    def emit(self, event):
+        event['ts'] = round(time.time(), 3)
+        with self._lock:
+            self.callback(event)
+
+    @staticmethod
+    def _context(info):
+        info = info or {}
+        return {'id': info.get('id'), 'title': info.get('title'),
+                'playlist_index': info.get('playlist_index')}
+
+    def progress_hook(self, d):
+        """yt-dlp progress_hooks 回调"""
+        filename = d.get('filename') or ''
+        event = {**self._context(d.get('info_dict')), 'file': Path(filename).name}
+        status = d.get('status')
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+
+        if status == 'downloading':
+            now = time.monotonic()
+            percent = downloaded * 100 / total if total else None
+            with self._lock:
+                state = self._files.get(filename)
+                if state is None:
+                    state = self._files[filename] = {'time': 0.0, 'percent': 0.0}
+                    first = True
+                else:
+                    first = False
+                due = now - state['time'] >= self.interval or \
+                    (percent is not None and percent - state['percent'] >= self.percent_step)
+                if due:
+                    state['time'] = now
+                    state['percent'] = percent or 0.0
+            if first:
+                self.emit({'event': 'start', **event, 'total': total})
+            if due:
+                eta, speed = d.get('eta'), d.get('speed')
+                self.emit({
+                    'event': 'progress', **event,
+                    'bytes': downloaded,
+                    'total': total,
+                    'percent': round(percent, 1) if percent is not None else None,
+                    'speed': int(speed) if speed else None,
+                    'eta': int(eta) if eta is not None else None,
+                    'fragment_index': d.get('fragment_index'),
+                    'fragment_count': d.get('fragment_count'),
+                })
+        elif status in ('finished', 'error'):
+            with self._lock:
+                self._files.pop(filename, None)
+            if status == 'finished' and 'downloaded_bytes' not in d:
+                # 文件已存在，yt-dlp 未下载直接报告完成
+                self.emit({'event': 'exists', **event, 'bytes': total})
+            elif status == 'finished':
+                elapsed = d.get('elapsed')
+                self.emit({'event': 'downloaded', **event, 'bytes': downloaded or total,
+                           'elapsed': round(elapsed, 2) if elapsed is not None else None})
+            else:
+                self.emit({'event': 'error', **event, 'message': 'download failed'})
+
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor_hooks 回调：后处理阶段 (合并、提取音频、嵌入元数据等)"""
+        context = self._context(d.get('info_dict'))
+        phase = (d.get('postprocessor'), d.get('status'))
+        with self._lock:
+            # 部分后处理器会重复报告同一状态，只保留一次
+            if self._phases.get(context['id']) == phase:
+                return
+            self._phases[context['id']] = phase
+        self.emit({'event': 'postprocess', **context, 'phase': phase[0], 'status': phase[1]})
+
+    def ydl_options(self, ydl_opts):
+        """返回接入本事件源的 YoutubeDL 参数 (关闭 yt-dlp 自带的进度行和终端标题)"""
+        return {
+            **ydl_opts,
+            'noprogress': True,
+            'consoletitle': False,
+            'progress_hooks': list(ydl_opts.get('progress_hooks') or []) + [self.progress_hook],
+            'postprocessor_hooks': list(ydl_opts.get('postprocessor_hooks') or []) + [self.postprocessor_hook],
+        }
+
+    def handle_line(self, line):
+        """
+        子进程方式：解析 PROGRESS_TEMPLATES 输出的进度行并转换为事件
+        返回该行是否为进度行 (否则由调用方原样输出)
+        """
+        marker, _, rest = line.rstrip('\n').partition('\t')
+        if marker not in (PROGRESS_MARKER, POSTPROCESS_MARKER):
+            return False
+        progress, _, info = rest.partition('\t')
+        try:
+            d = {**json.loads(progress), 'info_dict': json.loads(info)}
+        except ValueError:
+            return False
+        if marker == PROGRESS_MARKER:
+            self.progress_hook(d)
+        else:
+            self.postprocessor_hook(d)
+        return True
+
+
+def _format_eta(seconds):
+    return f"{seconds // 60}:{seconds % 60:02d}" if seconds is not None else '--:--'
+
+
+class ConsoleRenderer:
+    """逐个下载时的终端输出：当前文件一行 \r 进度 (速度、剩余时间、分片)"""
+
+    def handle(self, event):
+        name = event['event']
+        if name == 'progress':
+            line = f"\r   进度: {event['bytes'] / 1024 / 1024:.1f}"
+            if event['total']:
+                line += f"/{event['total'] / 1024 / 1024:.1f} MB ({event['percent']:.1f}%)"
+            else:
+                line += " MB"
+            if event['speed']:
+                line += f" | {event['speed'] / 1024 / 1024:.1f} MB/s | 剩余 {_format_eta(event['eta'])}"
+            if event['fragment_count']:
+                line += f" | 分片 {event['fragment_index']}/{event['fragment_count']}"
+            print(f"{line}\033[K", end='', flush=True)
+        elif name == 'downloaded':
+            size = f" ({event['bytes'] / 1024 / 1024:.1f} MB)" if event['bytes'] else ''
+            print(f"\r\033[K   ✅ 已下载: {event['file']}{size}")
+        elif name == 'exists':
+            print(f"   ⏭️  文件已存在: {event['file']}")
+        elif name == 'postprocess' and event['status'] == 'started' and event['phase'] != 'MoveFiles':
+            print(f"   🔧 后处理: {event['phase']}")
+        elif name == 'error':
+            print(f"\n   ❌ 下载失败: {event['file']}")
+
+
+class LogRenderer:
+    """并行下载时的终端输出：只输出开始和失败，不刷新进度行 (完成情况由播放列表汇总输出)"""
+
+    def handle(self, event):
+        name = event['event']
+        if name == 'start':
+            index = event['playlist_index']
+            prefix = f"{index:03d} - " if isinstance(index, int) else ''
+            print(f"   ⬇️  开始下载: {prefix}{event['title'] or event['file']}", flush=True)
+        elif name == 'error':
+            print(f"   ❌ 下载失败: {event['file']}", flush=True)
+
+
+class JsonLinesRenderer:
+    """机器可读的进度输出：每个事件一行 JSON，供编排程序解析；人类可读的日志此时输出到 stderr"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def handle(self, event):
+        self.stream.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+
+def create_progress_emitter(progress='human', concurrent=False, stream=None):
+    """
+    按输出模式创建进度事件源
+    progress: 'human'、'jsonl' (事件逐行写入 stream) 或 callback(event) 函数
+    """
+    if callable(progress):
+        return ProgressEmitter(progress)
+    if progress == 'jsonl':
+        return ProgressEmitter(JsonLinesRenderer(stream).handle, interval=1.0, percent_step=5.0)
+    if concurrent:
+        return ProgressEmitter(LogRenderer().handle)
+    return ProgressEmitter(ConsoleRenderer().handle, interval=0.2)
+
+
+class RunManifest:
+    """
+    本次运行产生的文件清单
+    由 yt-dlp postprocessor_hooks 在文件移动到最终位置时收集 (媒体文件、info.json、字幕、缩略图)，
+    只记录本次处理过的视频，不遍历输出目录
+    """
+
+    def __init__(self, url, output_dir):
+        self.url = url
+        self.output_dir = Path(output_dir).resolve()
+        self.started_at = datetime.now().isoformat()
+        self.videos = []
+        self._lock = threading.Lock()
+
+    def _file(self, path, kind):
+        path = Path(path).resolve()
+        if not path.is_file():
+            return None
+        try:
+            relative = str(path.relative_to(self.output_dir))
+        except ValueError:
+            relative = None
+        return {'path': str(path), 'relative_path': relative, 'kind': kind, 'size': path.stat().st_size}
+
+    def add_video(self, info, status=None):
+        """
+        记录一个处理完成的视频
+        status: 'downloaded' 本次下载、'existing' 文件已存在 (未下载)，默认按 yt-dlp 的 __real_download 判断
+        """
+        candidates = [(info.get('filepath'), 'media'), (info.get('infojson_filename'), 'infojson')]
+        for sub in (info.get('requested_subtitles') or {}).values():
+            candidates.append((sub.get('filepath'), 'subtitle'))
+        for thumbnail in info.get('thumbnails') or []:
+            candidates.append((thumbnail.get('filepath'), 'thumbnail'))
+
+        files, seen = [], set()
+        for path, kind in candidates:
+            if path and path not in seen:
+                seen.add(path)
+                entry = self._file(path, kind)
+                if entry:
+                    files.append(entry)
+        if status is None:
+            status = 'downloaded' if info.get('__real_download') else 'existing'
+        with self._lock:
+            self.videos.append({
+                'id': info.get('id'),
+                'extractor': info.get('extractor_key'),
+                'title': info.get('title'),
+                'status': status,
+                'files': files,
+            })
+
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor_hooks 回调：文件移动到最终位置后记录"""
+        if d['status'] == 'finished' and d['postprocessor'] == 'MoveFiles':
+            self.add_video(d['info_dict'])
+
+    def ydl_options(self, ydl_opts):
+        """返回接入本清单的 YoutubeDL 参数"""
+        return {
+            **ydl_opts,
+            'postprocessor_hooks': list(ydl_opts.get('postprocessor_hooks') or []) + [self.postprocessor_hook],
+        }
+
+    def files(self, status=None):
+        """清单中的所有文件，可按视频状态过滤"""
+        with self._lock:
+            return [f for video in self.videos if status in (None, video['status'])
+                    for f in video['files']]
+
+    def save(self, path, success):
+        """原子写入清单 JSON"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = {
+                'url': self.url,
+                'output_dir': str(self.output_dir),
+                'started_at': self.started_at,
+                'finished_at': datetime.now().isoformat(),
+                'success': success,
+                'videos': self.videos,
+            }
+            tmp_path = path.with_name(path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+
+def record_errors(ydl):
+    """
+    记录 YoutubeDL 通过公开的 report_error 报告的错误，返回错误信息列表 (原有输出不变)
+    忽略错误时 (如播放列表中单个条目失败) yt-dlp 不抛出异常，只能由此判断是否成功
+    """
+    errors = []
+    report_error = ydl.report_error
+
+    def record(message, *args, **kwargs):
+        errors.append(message)
+        return report_error(message, *args, **kwargs)
+
+    ydl.report_error = record
+    return errors
+
+
+def download_with_api(yt_dlp, url, ydl_opts, archive=None):
+    """
+    在本进程内用 yt_dlp 下载：页面只解析一次，同一份 info 既用于显示信息也用于下载
+    archive: DownloadArchive，URL 能识别出视频 ID 且已在索引中时不解析页面直接跳过
+    返回是否成功
+    """
+    if archive is not None:
+        key = archive_id_from_url(yt_dlp, url)
+        if key and key in archive:
+            print(f"\n📚 已在下载索引中 ({key})，跳过")
+            return True
+        ydl_opts = archive.ydl_options(ydl_opts)
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            errors = record_errors(ydl)
+            print("\n📡 正在获取视频信息...")
+            info = ydl.extract_info(url, download=False)
+            if not info:
+                print("\n❌ 获取视频信息失败")
+                return False
+            print_video_info(info)
+
+            print("\n" + "=" * 50)
+            print("⬇️  开始下载...")
+            print()
+            # 已解析的 info 直接进入下载阶段，与 yt-dlp --load-info-json 相同，不再请求页面
+            ydl.process_ie_result(info, download=True)
+            # 播放列表中单个条目失败不会抛出异常，但会经 report_error 输出 (与命令行退出码一致)
+            return not errors
+    except yt_dlp.utils.DownloadError:
+        # 错误信息已由 yt-dlp 输出
+        return False
+
+
+def site_key(extractor_key):
+    """把 yt-dlp 的提取器名 (如 YoutubeTab、BiliBili) 归并为网站名，用于并发限制"""
+    key = (extractor_key or 'generic').lower()
+    if key.startswith('youtube'):
+        return 'youtube'
+    if key.startswith('bili'):
+        return 'bilibili'
+    return key
+
+
+def parse_site_limits(values):
+    """解析 --site-limit 参数 (如 ['youtube=2', 'default=6'])，返回合并默认值后的上限表"""
+    limits = dict(DEFAULT_SITE_LIMITS)
+    for value in values or []:
+        site, sep, count = value.partition('=')
+        if not sep or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"无效的网站并发限制: {value} (格式: 网站=数量)")
+        limits[site_key(site.strip())] = int(count)
+    return limits
+
+
+def is_throttled(error):
+    """下载错误是否为网站限流"""
+    message = str(error).lower()
+    return any(pattern in message for pattern in THROTTLE_PATTERNS)
+
+
+class SiteLimiter:
+    """
+    按网站限制并发下载数
+    某个网站限流时，该网站的所有工作线程一起暂停 (指数退避 + 随机抖动)，其他网站不受影响
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._paused_until = {}
+
+    def _semaphore(self, site):
+        with self._lock:
+            if site not in self._semaphores:
+                limit = self.limits.get(site, self.limits['default'])
+                self._semaphores[site] = threading.BoundedSemaphore(limit)
+            return self._semaphores[site]
+
+    @contextmanager
+    def slot(self, site):
+        """占用该网站的一个下载名额，网站处于退避期时先等待"""
+        with self._semaphore(site):
+            while True:
+                with self._lock:
+                    delay = self._paused_until.get(site, 0) - time.monotonic()
+                if delay <= 0:
+                    break
+                time.sleep(delay)
+            yield
+
+    def backoff(self, site, attempt):
+        """记录一次限流，返回本次退避秒数"""
+        delay = min(THROTTLE_BACKOFF * 2 ** attempt, THROTTLE_MAX_BACKOFF)
+        delay *= random.uniform(0.8, 1.2)
+        with self._lock:
+            self._paused_until[site] = max(self._paused_until.get(site, 0), time.monotonic() + delay)
+        return delay
+
+
+def enumerate_playlist(yt_dlp, url, ydl_opts):
+    """
+    平铺解析播放列表：只读取列表本身，不解析每个条目的页面
+    返回 (播放列表 info, [(序号, 条目)])，序号与 yt-dlp 的 playlist_index 一致
+    """
+    with yt_dlp.YoutubeDL({**ydl_opts, 'extract_flat': 'in_playlist'}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not info:
+        return None, []
+    entries = [entry for entry in info.get('entries') or [] if entry]
+    indices = info.get('requested_entries') or range(1, len(entries) + 1)
+    return info, list(zip(indices, entries))
+
+
+def playlist_entry_context(info, index, autonumber):
+    """条目的播放列表字段，使 %(playlist_title)s / %(playlist_index)03d 等模板与顺序下载时一致"""
+    return {
+        'playlist': info.get('title') or info.get('id'),
+        'playlist_id': info.get('id'),
+        'playlist_title': info.get('title'),
+        'playlist_uploader': info.get('uploader'),
+        'playlist_uploader_id': info.get('uploader_id'),
+        'playlist_webpage_url': info.get('webpage_url'),
+        'playlist_count': info.get('playlist_count'),
+        'n_entries': len(info.get('entries') or []),
+        'playlist_index': index,
+        'playlist_autonumber': autonumber,
+    }
+
+
+def filter_archived(yt_dlp, entries, archive, sync=False):
+    """
+    按下载索引过滤平铺条目 (此时尚未解析任何视频页面)
+    条目不带提取器和 ID 时 (如通用 RSS 中的 url_transparent 条目)，改从条目 URL 推出索引键
+    sync: 遇到第一个已下载的条目即停止 (频道和播放列表按新到旧排列时，只保留新发布的)；
+          遇到无法确定索引键的条目时同样停止，避免把更早的节目全部下载一遍
+    返回 (待下载条目, 跳过数量, 同步因无法确定索引键而停止的条目序号或 None)
+    """
+    pending = []
+    for position, (index, entry) in enumerate(entries):
+        key = archive_id(entry)
+        if not key and entry.get('url'):
+            key = archive_id_from_url(yt_dlp, entry['url'])
+        if not key and sync:
+            return pending, len(entries) - position, index
+        if key and key in archive:
+            if sync:
+                return pending, len(entries) - position, None
+            continue
+        pending.append((index, entry))
+    return pending, len(entries) - len(pending), None
+
+
+def download_playlist_parallel(yt_dlp, url, ydl_opts, jobs=3, site_limits=None, archive=None,
+                               sync=False):
+    """
+    播放列表并行下载：先平铺解析出条目，再由 jobs 个工作线程分别解析并下载，
+    每个网站的并发数受 site_limits 限制，遇到限流自动退避重试
+    archive: DownloadArchive，已下载的条目在解析页面前跳过；sync: 只下载第一个已下载条目之前的新条目
+    返回是否全部成功
+    """
+    print("\n📡 正在获取播放列表...")
+    info, entries = enumerate_playlist(yt_dlp, url, ydl_opts)
+    if not info:
+        print("\n❌ 获取播放列表失败")
+        return False
+    if info.get('_type', 'video') != 'playlist':
+        # 不是播放列表 (单个视频)，按普通方式下载
+        return download_with_api(yt_dlp, url, ydl_opts, archive)
+    print(f"📋 播放列表: {info.get('title') or info.get('id')} ({len(entries)} 个视频)")
+    if archive is not None:
+        entries, skipped, unknown = filter_archived(yt_dlp, entries, archive, sync)
+        if unknown is not None:
+            print(f"⚠️  第 {unknown} 个条目无法确定视频 ID，同步模式无法判断它是否已下载，"
+                  f"只下载它之前的 {len(entries)} 个新视频 (跳过其余 {skipped} 个)")
+        elif sync:
+            print(f"🔄 同步模式: {len(entries)} 个新视频 (从第一个已下载的视频起跳过 {skipped} 个)")
+        elif skipped:
+            print(f"📚 下载索引中已有 {skipped} 个，跳过")
+        ydl_opts = archive.ydl_options(ydl_opts)
+    if not entries:
+        print("\n✅ 没有需要下载的视频")
+        return True
+
+    limiter = SiteLimiter(site_limits or DEFAULT_SITE_LIMITS)
+    # 每个工作线程独占一个 YoutubeDL 实例；错误改为抛出，由这里统一分类和重试
+    worker_opts = {**ydl_opts, 'ignoreerrors': False}
+    local = threading.local()
+    instances = []
+
+    def get_ydl():
+        if not hasattr(local, 'ydl'):
+            local.ydl = yt_dlp.YoutubeDL(worker_opts)
+            instances.append(local.ydl)
+        return local.ydl
+
+    def download_entry(index, autonumber, entry):
+        site = site_key(entry.get('ie_key') or info.get('extractor_key'))
+        extra = playlist_entry_context(info, index, autonumber)
+        attempt = 0
+        while True:
+            with limiter.slot(site):
+                try:
+                    get_ydl().process_ie_result(dict(entry), download=True, extra_info=extra)
+                    return
+                except yt_dlp.utils.DownloadError as e:
+                    if not is_throttled(e) or attempt >= THROTTLE_RETRIES:
+                        raise
+            delay = limiter.backoff(site, attempt)
+            attempt += 1
+            print(f"⏳ {site} 限流，{delay:.0f} 秒后重试第 {index} 个 ({attempt}/{THROTTLE_RETRIES})")
+
+    print(f"\n⬇️  开始下载 ({jobs} 个并发)...")
+    print()
+    started = time.monotonic()
+    failures = []
+    succeeded = 0
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(download_entry, index, autonumber, entry): (index, entry)
+                for autonumber, (index, entry) in enumerate(entries, 1)
+            }
+            for future in as_completed(futures):
+                index, entry = futures[future]
+                title = entry.get('title') or entry.get('id') or entry.get('url')
+                try:
+                    future.result()
+                    succeeded += 1
+                    print(f"✅ [{succeeded + len(failures)}/{len(entries)}] {index:03d} - {title}")
+                except Exception as e:
+                    failures.append((index, title, e))
+                    print(f"❌ [{succeeded + len(failures)}/{len(entries)}] {index:03d} - {title}")
+    finally:
+        for ydl in instances:
+            ydl.close()
+
+    elapsed = time.monotonic() - started
+    print("\n" + "=" * 50)
+    print(f"📊 播放列表汇总: 成功 {succeeded}，失败 {len(failures)}，共 {len(entries)} 个，"
+          f"耗时 {elapsed:.1f} 秒")
+    for index, title, error in sorted(failures, key=lambda item: item[0]):
+        print(f"   ❌ {index:03d} - {title}: {str(error).replace('ERROR: ', '', 1)}")
+    return not failures
+
+
+def download_with_subprocess(url, cmd, cookies_file=None, manifest=None, emitter=None):
+    """
+    子进程方式 (未安装 yt_dlp 包或 --engine subprocess)：先 yt-dlp -j 获取信息，再启动下载进程
+    manifest: RunManifest，通过 --print-to-file 逐行写出每个视频的信息和最终文件路径 (JSON)
+    emitter: ProgressEmitter，yt-dlp 按 PROGRESS_TEMPLATES 逐行输出进度，解析为与进程内方式相同的事件
+    返回是否成功
+    """
+    if emitter is not None:
+        cmd = cmd[:-1] + ['--newline'] + PROGRESS_TEMPLATES + [cmd[-1]]
+    paths_file = None
+    if manifest is not None:
+        fd, paths_file = tempfile.mkstemp(prefix='yt-dlp-files-', suffix='.jsonl')
+        os.close(fd)
+        # 除媒体文件外，同时输出字幕、info.json 和封面的最终路径，清单与进程内方式一致
+        template = ('after_move:%(.{id,extractor_key,title,filepath,infojson_filename,'
+                    'requested_subtitles,thumbnails,__real_download})j')
+        cmd = cmd[:-1] + ['--print-to-file', template, paths_file, cmd[-1]]
+
+    print("\n📡 正在获取视频信息...")
+    info = get_video_info(url, cookies_file)
+    if info:
+        print_video_info(info)
+
+    print("\n" + "=" * 50)
+    print("⬇️  开始下载...")
+    print()
+
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        universal_newlines=True
+    )
+
+    # 进度行转换为事件，其余输出原样转发
+    for line in process.stdout:
+        if emitter is None or not emitter.handle_line(line):
+            print(line, end='')
+
+    process.wait()
+
+    if paths_file:
+        with open(paths_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    manifest.add_video(json.loads(line))
+        os.unlink(paths_file)
+
+    if process.returncode != 0:
+        print(f"\n❌ 下载失败，退出码: {process.returncode}")
+        return False
+    return True
+
+
 def download_video(url, output_dir='.', format_quality='best', audio_only=False,
                    subtitles=False, sub_lang='en,zh-Hans', cookies_file=None,
                    is_playlist=False, playlist_count=None, save_metadata=True,
-                   download_thumbnail=False):
+                   download_thumbnail=False, engine='auto', jobs=1, site_limits=None,
+                   archive_path=None, sync=False, manifest_path=None, progress='human',
+                   progress_stream=None):
     """
     下载视频
+    engine: 'api' 在本进程内调用 yt_dlp (只解析一次页面)，'subprocess' 调用 yt-dlp 命令，
+    'auto' 在已安装 yt_dlp 包时使用 api
+    jobs: 播放列表并行下载的工作线程数 (仅 api 方式)，site_limits: 每个网站的并发上限
+    archive_path: 下载索引路径 (仅 api 方式，None 为不使用)；sync: 只下载播放列表中的新视频
+    manifest_path: 本次运行的文件清单 JSON 路径 (None 为不保存)
+    progress: 'human' 终端进度，'jsonl' 把进度事件逐行写入 progress_stream，或 callback(event) 函数
     """
     print("🎬 YouTube/视频下载器 (yt-dlp)")
     print("=" * 50)
 
     # 检查依赖
-    if not check_ytdlp_installed():
+    yt_dlp = load_ytdlp() if engine in ('auto', 'api') else None
+    if engine == 'api' and yt_dlp is None:
+        print("❌ 未找到 yt_dlp Python 包，请运行: pip install yt-dlp")
+        return False
+    if not check_ytdlp_installed(yt_dlp):
         return False
 
     if audio_only and not check_ffmpeg_installed():
@@ -168,26 +958,14 @@ def download_video(url, output_dir='.', format_quality='best', audio_only=False,
     if is_playlist:
         count_str = f"前 {playlist_count} 个" if playlist_count else "全部"
         print(f"📋 播放列表模式: {count_str}")
+        if jobs > 1 and yt_dlp is None:
+            print("⚠️  子进程方式不支持并行下载播放列表，将逐个下载")
+    if archive_path and yt_dlp is None:
+        print("⚠️  子进程方式不使用下载索引")
+    archive = DownloadArchive(archive_path) if archive_path and yt_dlp is not None else None
 
-    # 获取视频信息
-    print("\n📡 正在获取视频信息...")
-    info = get_video_info(url, cookies_file)
-
-    if info:
-        if 'title' in info:
-            print(f"📺 标题: {info.get('title', 'Unknown')}")
-        if 'uploader' in info:
-            print(f"👤 作者: {info.get('uploader', 'Unknown')}")
-        if 'duration' in info and info['duration']:
-            duration_min = info['duration'] // 60
-            duration_sec = info['duration'] % 60
-            print(f"⏱️  时长: {duration_min}:{duration_sec:02d}")
-        if 'view_count' in info and info['view_count']:
-            print(f"👁️  观看: {info['view_count']:,}")
-
-    # 构建命令
-    cmd = build_ytdlp_command(
-        url=url,
+    # 构建 yt-dlp 选项
+    args = build_ytdlp_args(
         output_dir=output_dir,
         format_quality=format_quality,
         audio_only=audio_only,
@@ -200,43 +978,38 @@ def download_video(url, output_dir='.', format_quality='best', audio_only=False,
     )
 
     # 执行下载
-    print("\n" + "=" * 50)
-    print("⬇️  开始下载...")
-    print()
-
+    manifest = RunManifest(url, output_path)
+    emitter = create_progress_emitter(progress, concurrent=is_playlist and jobs > 1 and yt_dlp is not None,
+                                      stream=progress_stream)
+    ok = False
     try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-
-        # 实时输出进度
-        for line in process.stdout:
-            print(line, end='')
-
-        process.wait()
+        if yt_dlp is not None:
+            ydl_opts = emitter.ydl_options(manifest.ydl_options(build_ydl_options(yt_dlp, args)))
+            if is_playlist and (jobs > 1 or sync):
+                # 并行下载或同步模式需要先平铺解析条目；否则与原来一样交给 yt-dlp 逐个下载
+                ok = download_playlist_parallel(yt_dlp, url, ydl_opts, jobs=jobs,
+                                                site_limits=site_limits, archive=archive, sync=sync)
+            else:
+                ok = download_with_api(yt_dlp, url, ydl_opts, archive)
+        else:
+            ok = download_with_subprocess(url, ['yt-dlp'] + args + [url], cookies_file, manifest, emitter)
 
-        if process.returncode == 0:
+        if ok:
             print("\n" + "=" * 50)
             print("✨ 下载完成!")
             print(f"📂 文件保存在: {output_path.absolute()}")
 
-            # 列出下载的文件
-            print("\n📁 下载的文件:")
-            for f in sorted(output_path.rglob('*')):
-                if f.is_file() and not f.name.startswith('.'):
-                    size_mb = f.stat().st_size / 1024 / 1024
-                    rel_path = f.relative_to(output_path)
-                    print(f"   • {rel_path} ({size_mb:.1f} MB)")
+            # 列出本次下载的文件 (来自清单，不遍历输出目录)
+            downloaded = manifest.files('downloaded')
+            existing = len(manifest.files('existing'))
+            print(f"\n📁 下载的文件 ({len(downloaded)} 个):")
+            for f in downloaded:
+                size_mb = f['size'] / 1024 / 1024
+                print(f"   • {f['relative_path'] or f['path']} ({size_mb:.1f} MB)")
+            if existing:
+                print(f"   (另有 {existing} 个文件已存在，未重新下载)")
 
-            return True
-        else:
-            print(f"\n❌ 下载失败，退出码: {process.returncode}")
-            return False
+        return ok
 
     except subprocess.SubprocessError as e:
         print(f"\n❌ 下载出错: {e}")
@@ -244,6 +1017,10 @@ def download_video(url, output_dir='.', format_quality='best', audio_only=False,
     except KeyboardInterrupt:
         print("\n\n⚠️  下载被用户中断")
         return False
+    finally:
+        if manifest_path:
+            manifest.save(manifest_path, ok)
+            print(f"🧾 文件清单: {manifest_path}")
 
 
 def main():
@@ -267,6 +1044,12 @@ def main():
   # 下载播放列表的前 5 个视频
   %(prog)s "https://www.youtube.com/playlist?list=PLAYLIST_ID" --playlist -n 5
 
+  # 频道补档: 6 个并发，其中 YouTube 最多 2 个
+  %(prog)s "https://www.youtube.com/@channel/videos" --playlist -j 6 --site-limit youtube=2
+
+  # 每日增量同步频道 (只下载新发布的视频)
+  %(prog)s "https://www.youtube.com/@channel/videos" --playlist --sync -o /path/to/library
+
   # 指定输出目录
   %(prog)s "URL" -o /path/to/output
 
@@ -291,28 +1074,68 @@ def main():
                         help='启用播放列表下载')
     parser.add_argument('-n', '--count', type=int,
                         help='播放列表中下载的视频数量')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='播放列表并行下载的视频数 (默认: 1，逐个下载)')
+    parser.add_argument('--site-limit', action='append', metavar='SITE=N',
+                        help='单个网站的并发上限，可重复指定 '
+                             '(默认: youtube=3, bilibili=2, default=4)')
     parser.add_argument('--thumbnail', action='store_true',
                         help='下载缩略图')
     parser.add_argument('--cookies', type=str,
                         help='Cookies 文件路径 (用于需要登录的内容)')
     parser.add_argument('--no-metadata', action='store_true',
                         help='不保存元数据 JSON')
+    parser.add_argument('--archive', metavar='PATH',
+                        help=f'下载索引路径 (默认: <输出目录>/{ARCHIVE_FILENAME})')
+    parser.add_argument('--no-archive', action='store_true',
+                        help='不使用下载索引')
+    parser.add_argument('--sync', action='store_true',
+                        help='增量同步: 只下载播放列表/频道中比最近一次已下载视频更新的视频')
+    parser.add_argument('--manifest', metavar='PATH',
+                        help=f'本次运行的文件清单 JSON (默认: <输出目录>/{MANIFEST_FILENAME})')
+    parser.add_argument('--progress', choices=['human', 'jsonl'], default='human',
+                        help='进度输出格式: human 为终端进度；jsonl 时向 stdout 逐行输出 JSON 事件，'
+                             '其余日志输出到 stderr (默认: human)')
+    parser.add_argument('--engine', default='auto', choices=['auto', 'api', 'subprocess'],
+                        help='下载方式: api 为进程内调用 yt_dlp，subprocess 为调用 yt-dlp 命令 '
+                             '(默认: auto，已安装 yt_dlp 包时使用 api)')
 
     args = parser.parse_args()
+    try:
+        site_limits = parse_site_limits(args.site_limit)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.sync and args.no_archive:
+        parser.error('--sync 需要下载索引，不能与 --no-archive 同时使用')
 
-    success = download_video(
-        url=args.url,
-        output_dir=args.output,
-        format_quality=args.format,
-        audio_only=args.audio_only,
-        subtitles=args.subtitles,
-        sub_lang=args.sub_lang,
-        cookies_file=args.cookies,
-        is_playlist=args.playlist,
-        playlist_count=args.count,
-        save_metadata=not args.no_metadata,
-        download_thumbnail=args.thumbnail
-    )
+    archive_path = None
+    if not args.no_archive:
+        archive_path = args.archive or str(Path(args.output) / ARCHIVE_FILENAME)
+
+    progress_stream = sys.stdout
+    log_target = sys.stderr if args.progress == 'jsonl' else sys.stdout
+    with redirect_stdout(log_target):
+        success = download_video(
+            url=args.url,
+            output_dir=args.output,
+            format_quality=args.format,
+            audio_only=args.audio_only,
+            subtitles=args.subtitles,
+            sub_lang=args.sub_lang,
+            cookies_file=args.cookies,
+            is_playlist=args.playlist,
+            playlist_count=args.count,
+            save_metadata=not args.no_metadata,
+            download_thumbnail=args.thumbnail,
+            engine=args.engine,
+            jobs=max(1, args.jobs),
+            site_limits=site_limits,
+            archive_path=archive_path,
+            sync=args.sync,
+            manifest_path=args.manifest or str(Path(args.output) / MANIFEST_FILENAME),
+            progress=args.progress,
+            progress_stream=progress_stream
+        )
 
     return 0 if success else 1
 